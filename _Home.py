@@ -1,6 +1,6 @@
 import streamlit as st
 from PIL import Image
-from db import init_db, get_conn
+from db import init_db
 import pandas as pd
 
 # Initialize DB
@@ -30,8 +30,6 @@ except:
 
 
 # --- Quick Stats ---
-conn = get_conn()
-cursor = conn.cursor()
 
 
 
@@ -48,5 +46,3 @@ col4.button("📊 Dashboard")
     # st.experimental_set_query_params(page="DASHBOARD")
 
 st.markdown("<div style='text-align:center;color:#888;'>© 2025 Seeloo Tile Factory, Sopore</div>", unsafe_allow_html=True)
-
-conn.close()
@@ -0,0 +1,109 @@
+"""Read-query cache shared by every page and session in the process.
+
+Each table has a write generation. Write paths bump the generations of the
+tables they touched, and cached results are keyed on the generations of the
+tables the query reads, so a write invalidates exactly the results that
+depend on it and everything else keeps being served from memory.
+
+Writes made by other processes (or anything else that bypasses
+``invalidate``) are picked up through ``ChangeWatcher``: triggers keep a
+per-table counter in ``table_versions`` and the watcher re-reads it whenever
+``PRAGMA data_version`` says another connection has committed.
+"""
+import threading
+from collections import defaultdict
+
+import pandas as pd
+import streamlit as st
+
+from db import connection, get_pool, open_conn
+
+_lock = threading.Lock()
+_generations = defaultdict(int)
+
+
+class ChangeWatcher:
+    """Polls one dedicated connection for commits made by any other connection."""
+
+    def __init__(self):
+        get_pool()  # the pool migrates the schema, including table_versions
+        self._conn = open_conn()
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._versions = {}
+
+    def versions(self):
+        """Current ``table_versions`` snapshot, re-read only after a foreign commit."""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._versions = dict(self._conn.execute("SELECT name, version FROM table_versions"))
+                self._data_version = data_version
+            return self._versions
+
+    def changed_tables(self, seen):
+        """Tables whose version differs from the ``seen`` snapshot."""
+        current = self.versions()
+        return {table for table, version in current.items() if seen.get(table) != version}
+
+
+@st.cache_resource
+def get_watcher():
+    return ChangeWatcher()
+
+
+def generations(tables):
+    versions = get_watcher().versions()
+    with _lock:
+        return tuple((_generations[table], versions.get(table, 0)) for table in tables)
+
+
+def invalidate(*tables):
+    """Call after committing a write to ``tables``."""
+    with _lock:
+        for table in tables:
+            _generations[table] += 1
+
+
+# ``tables`` and ``generations`` are only part of the cache key
+@st.cache_data(max_entries=256, show_spinner=False)
+def _read_sql(sql, params, tables, generations):
+    with connection() as conn:
+        return pd.read_sql(sql, conn, params=params)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _fetch(sql, params, tables, generations):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def read_sql(sql, tables, params=()):
+    """``pd.read_sql`` cached until one of ``tables`` is written."""
+    tables = tuple(tables)
+    return _read_sql(sql, tuple(params), tables, generations(tables))
+
+
+def fetch(sql, tables, params=()):
+    """``fetchall`` rows cached until one of ``tables`` is written."""
+    tables = tuple(tables)
+    return _fetch(sql, tuple(params), tables, generations(tables))
+
+
+# ``_build`` is not hashable, so it is keyed by its qualified ``name`` instead
+@st.cache_resource(max_entries=64, show_spinner=False)
+def _derive(_build, name, sql, params, tables, generations):
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return _build(rows)
+
+
+def derive(build, sql, tables, params=()):
+    """``build(rows)`` built once per write generation of ``tables``.
+
+    The result is shared by every session rather than copied per call, so
+    callers must treat it as read-only.
+    """
+    tables = tuple(tables)
+    name = f"{build.__module__}.{build.__qualname__}"
+    return _derive(build, name, sql, tuple(params), tables, generations(tables))
@@ -1,18 +1,155 @@
+import queue
+import re
 import sqlite3
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from pathlib import Path
 
+import streamlit as st
+
+from ledger import ROLLUP_TABLES, apply_rollups, apply_totals, fill_rollups, fill_totals
+from products import get_product_id, parse_product_name
+from stock import adjust_stocks, fill_stock
+
 DB_PATH = Path("data/tiles.db")
 DB_PATH.parent.mkdir(exist_ok=True)
+POOL_SIZE = 8  # idle connections kept open
+
+# Applied to every connection the pool opens
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",          # readers no longer block on writers
+    "PRAGMA synchronous=NORMAL",        # safe with WAL, one fsync per checkpoint
+    "PRAGMA busy_timeout=5000",         # wait for a competing writer instead of failing
+    "PRAGMA cache_size=-16000",         # 16 MB page cache
+    "PRAGMA mmap_size=268435456",       # 256 MB memory-mapped reads
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def open_conn(path=DB_PATH):
+    """Open a standalone connection with the standard pragmas applied."""
+    # check_same_thread is off because pooled connections move between
+    # threads; each is only used by one thread at a time.
+    conn = sqlite3.connect(path, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Process-wide pool of idle, configured SQLite connections.
+
+    Streamlit runs every rerun on a new thread, so connections are not tied
+    to threads: a rerun checks one out for its queries and hands it back,
+    and the next rerun reuses it without reconnecting or re-running the
+    pragmas. A connection is only opened when every pooled one is in use.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()  # most recently used first, its page cache is warmest
+
+        conn = open_conn(path)
+        migrate(conn)
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = open_conn(self.path)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._idle.qsize() < self.size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+
+@st.cache_resource
+def get_pool():
+    return ConnectionPool(DB_PATH)
+
+def connection():
+    """``with connection() as conn:`` borrows a pooled connection for the block."""
+    return get_pool().connection()
 
 def get_conn():
-    return sqlite3.connect(DB_PATH)
+    """A connection of its own for a command-line script, on a migrated database."""
+    get_pool()
+    return open_conn(DB_PATH)
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# ------------------------ UNIT OF WORK ------------------------
+class UnitOfWork:
+    """Rows and derived-table deltas of one save, written together by ``flush``.
+
+    Rows are queued per table and written with one ``executemany`` each.
+    Stock, ledger and rollup deltas are summed per key first, so a 60-combo
+    production log touches each stock and rollup row once. ``flush`` runs on
+    the caller's transaction; pages hand it to the writer thread:
+
+        uow = UnitOfWork()
+        uow.insert("labour_payments", date=d, amount=a, purpose=p)
+        uow.add_totals(labour_paid=a)
+        write(uow.flush, tables=uow.tables)
+    """
+
+    def __init__(self):
+        self._rows = defaultdict(list)  # (table, columns) -> [values]
+        self._stock = Counter()
+        self._totals = Counter()
+        self._rollups = defaultdict(Counter)  # (date, product_id) -> column deltas
+
+    def insert(self, table, **row):
+        self._rows[(table, tuple(row))].append(tuple(row.values()))
+
+    def adjust_stock(self, product_id, delta):
+        self._stock[product_id] += delta
+
+    def add_totals(self, **deltas):
+        self._totals.update(deltas)
+
+    def add_rollup(self, date, product_id=None, **deltas):
+        self._rollups[(str(date), product_id or 0)].update(deltas)
+
+    @property
+    def tables(self):
+        """Every table ``flush`` writes, for cache invalidation."""
+        tables = {table for table, _ in self._rows}
+        if self._stock:
+            tables.add("tile_stock")
+        if self._totals:
+            tables.add("ledger_totals")
+        if self._rollups:
+            tables.update(table for table, _, _ in ROLLUP_TABLES)
+        return tuple(sorted(tables))
+
+    def flush(self, cursor):
+        for (table, columns), rows in self._rows.items():
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                rows
+            )
+        if self._stock:
+            adjust_stocks(cursor, self._stock)
+        apply_totals(cursor, **self._totals)
+        apply_rollups(cursor, self._rollups)
 
-def init_db():
-    conn = get_conn()
-    cursor = conn.cursor()
 
-    # Drop daily_log if exists to avoid old structure conflicts
+# ------------------------ MIGRATIONS ------------------------
+# Each step runs once, in order, inside its own transaction; PRAGMA user_version
+# records how many have been applied. Append new steps, never edit old ones.
 
+def _create_base_tables(cursor):
     # --- Labour payments table ---
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS labour_payments (
@@ -85,7 +222,7 @@ def init_db():
         )
     """)
 
-    # Create daily_log table if not exists
+    # --- Daily log table ---
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS daily_log (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -111,7 +248,438 @@ def init_db():
     )
     """)
 
+def _add_products(cursor):
+    """Move daily_log, sale and tile_stock from four TEXT descriptors to product ids."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tile_type TEXT NOT NULL,
+        interlock_subtype TEXT NOT NULL,
+        interlock_size TEXT NOT NULL,
+        color TEXT NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE (tile_type, interlock_subtype, interlock_size, color)
+    )
+    """)
+
+    # Databases converted before versioning already have product ids
+    if "product_id" not in table_columns(cursor.connection, "sale"):
+        # Catalog every SKU that appears anywhere in the old tables
+        cursor.execute("""
+            INSERT OR IGNORE INTO products (tile_type, interlock_subtype, interlock_size, color, name)
+            SELECT DISTINCT tile_type, interlock_subtype, interlock_size, color, ''
+            FROM (
+                SELECT tile_type, interlock_subtype, interlock_size, color FROM daily_log WHERE category='Tile'
+                UNION
+                SELECT tile_type, interlock_subtype, interlock_size, color FROM tile_stock
+            )
+        """)
+        cursor.execute("""
+            UPDATE products
+            SET name = REPLACE(tile_type || ' ' || interlock_subtype || ' ' || interlock_size || ' ' || color, ' - -', '')
+            WHERE name = ''
+        """)
+
+        # Legacy sale rows only carry the concatenated name; parse each distinct one once
+        cursor.execute("CREATE TEMP TABLE sale_product_map (name TEXT PRIMARY KEY, product_id INTEGER)")
+        for (name,) in cursor.execute("SELECT DISTINCT tile_type FROM sale").fetchall():
+            product_id = get_product_id(cursor, *parse_product_name(name))
+            cursor.execute("INSERT INTO sale_product_map VALUES (?, ?)", (name, product_id))
+
+        cursor.execute("""
+            CREATE TABLE daily_log_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT,
+                product_id INTEGER,
+                quantity INTEGER,
+                labour_charge REAL,
+                log_date DATE,
+                FOREIGN KEY(product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO daily_log_new (id, category, product_id, quantity, labour_charge, log_date)
+            SELECT d.id, d.category, p.id, d.quantity, d.labour_charge, d.log_date
+            FROM daily_log d
+            LEFT JOIN products p
+              ON d.category = 'Tile'
+             AND p.tile_type = d.tile_type AND p.interlock_subtype = d.interlock_subtype
+             AND p.interlock_size = d.interlock_size AND p.color = d.color
+        """)
+
+        cursor.execute("""
+            CREATE TABLE sale_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sale_id TEXT,
+                customer_name TEXT,
+                customer_phone_number TEXT,
+                product_id INTEGER,
+                quantity INTEGER,
+                price_per_tile REAL,
+                amount REAL,
+                payment_mode TEXT,
+                date TEXT,
+                FOREIGN KEY(product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO sale_new (id, sale_id, customer_name, customer_phone_number, product_id,
+                                  quantity, price_per_tile, amount, payment_mode, date)
+            SELECT s.id, s.sale_id, s.customer_name, s.customer_phone_number, m.product_id,
+                   s.quantity, s.price_per_tile, s.amount, s.payment_mode, s.date
+            FROM sale s
+            JOIN sale_product_map m ON m.name = s.tile_type
+        """)
+
+        cursor.execute("""
+            CREATE TABLE tile_stock_new (
+                product_id INTEGER PRIMARY KEY,
+                available_qty INTEGER,
+                FOREIGN KEY(product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO tile_stock_new (product_id, available_qty)
+            SELECT p.id, t.available_qty
+            FROM tile_stock t
+            JOIN products p
+              ON p.tile_type = t.tile_type AND p.interlock_subtype = t.interlock_subtype
+             AND p.interlock_size = t.interlock_size AND p.color = t.color
+        """)
+
+        for table in ("daily_log", "sale", "tile_stock"):
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        cursor.execute("DROP TABLE sale_product_map")
+
+    # --- Display views with the tile descriptors joined back in ---
+    cursor.execute("""
+    CREATE VIEW IF NOT EXISTS daily_log_items AS
+    SELECT d.id, d.category, d.product_id,
+           COALESCE(p.tile_type, d.category) AS tile_type,
+           COALESCE(p.interlock_subtype, '-') AS interlock_subtype,
+           COALESCE(p.interlock_size, '-') AS interlock_size,
+           COALESCE(p.color, '-') AS color,
+           d.quantity, d.labour_charge, d.log_date
+    FROM daily_log d
+    LEFT JOIN products p ON p.id = d.product_id
+    """)
+
+    cursor.execute("""
+    CREATE VIEW IF NOT EXISTS sale_items AS
+    SELECT s.id, s.sale_id, s.customer_name, s.customer_phone_number, s.product_id,
+           p.name AS item_name, p.tile_type, p.interlock_subtype, p.interlock_size, p.color,
+           s.quantity, s.price_per_tile, s.amount, s.payment_mode, s.date
+    FROM sale s
+    JOIN products p ON p.id = s.product_id
+    """)
+
+def _add_indexes(cursor):
+    # Today's log / dashboard history are filtered and sorted by date
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_log_date ON daily_log(log_date)")
+    # Covers production-per-SKU sums (stock rebuild, dashboard tile details)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_log_category ON daily_log(category, product_id, quantity)")
+
+    # Invoice lookup by sale, sales history by date, sold-per-SKU sums
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_sale_id ON sale(sale_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_date ON sale(date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_product ON sale(product_id, quantity)")
+
+    # Per-vendor balances, payment history and allowed materials
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_material_payments_vendor ON material_payments(vendor_id, date, amount)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_materials_vendor ON materials(vendor_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_materials_date ON materials(date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendor_materials_vendor ON vendor_materials(vendor_id)")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_labour_payments_date ON labour_payments(date)")
+
+def track_versions(cursor, *tables):
+    """Bump table_versions.<table> on every insert, update and delete."""
+    for table in tables:
+        cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+            END
+            """)
+
+def _add_table_versions(cursor):
+    # Lets every process see which tables any other connection has written
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+    track_versions(
+        cursor,
+        "labour_payments", "vendors", "vendor_materials", "materials", "material_payments",
+        "products", "sale", "daily_log", "tile_stock",
+    )
+
+def _add_ledger_totals(cursor):
+    # Single-row running totals for the dashboard KPIs (filled by migrate)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        labour_charges REAL NOT NULL DEFAULT 0,
+        labour_paid REAL NOT NULL DEFAULT 0,
+        material_expense REAL NOT NULL DEFAULT 0,
+        material_paid REAL NOT NULL DEFAULT 0,
+        tiles_produced INTEGER NOT NULL DEFAULT 0,
+        tiles_sold INTEGER NOT NULL DEFAULT 0,
+        sales_amount REAL NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO ledger_totals (id) VALUES (1)")
+    track_versions(cursor, "ledger_totals")
+
+def _add_rollups(cursor):
+    # Per-SKU sums per day and per month; product_id 0 = not tied to a SKU (filled by migrate)
+    for table, period in (("rollup_daily", "day"), ("rollup_monthly", "month")):
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            {period} TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            produced_qty INTEGER NOT NULL DEFAULT 0,
+            sold_qty INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            labour_charge REAL NOT NULL DEFAULT 0,
+            material_spend REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ({period}, product_id)
+        ) WITHOUT ROWID
+        """)
+    track_versions(cursor, "rollup_daily", "rollup_monthly")
+
+def _add_history_indexes(cursor):
+    # Sales records page through whole sales newest first: keyset on (date, sale_id)
+    cursor.execute("DROP INDEX IF EXISTS idx_sale_date")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_date_sale_id ON sale(date, sale_id)")
+
+def _add_invoices(cursor):
+    # Rendered invoice PDFs, keyed by sale and the hash of the rows they show
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS invoices (
+        sale_id TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        pdf BLOB NOT NULL,
+        rendered_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def _add_customer_indexes(cursor):
+    # Invoice finder prefix search; LIKE is case-insensitive, so NOCASE indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_customer ON sale(customer_name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_phone ON sale(customer_phone_number COLLATE NOCASE)")
+
+def _split_sales(cursor):
+    """Split sale into a sales header (integer invoice number) and sale_lines."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_name TEXT,
+        customer_phone_number TEXT,
+        payment_mode TEXT,
+        date TEXT
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sale_lines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sale_id INTEGER NOT NULL,
+        product_id INTEGER,
+        quantity INTEGER,
+        price_per_tile REAL,
+        amount REAL,
+        FOREIGN KEY(sale_id) REFERENCES sales(id),
+        FOREIGN KEY(product_id) REFERENCES products(id)
+    )
+    """)
 
-    conn.commit()
-    conn.close()
+    # Number existing sales in date order; header fields come from each sale's first line
+    cursor.execute("""
+        CREATE TEMP TABLE sale_number_map AS
+        SELECT sale_key, first_id, ROW_NUMBER() OVER (ORDER BY date, first_id) AS number
+        FROM (
+            SELECT COALESCE(sale_id, 'line-' || id) AS sale_key, MIN(id) AS first_id, MIN(date) AS date
+            FROM sale
+            GROUP BY sale_key
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO sales (id, customer_name, customer_phone_number, payment_mode, date)
+        SELECT m.number, s.customer_name, s.customer_phone_number, s.payment_mode, s.date
+        FROM sale_number_map m
+        JOIN sale s ON s.id = m.first_id
+        ORDER BY m.number
+    """)
+    cursor.execute("""
+        INSERT INTO sale_lines (id, sale_id, product_id, quantity, price_per_tile, amount)
+        SELECT s.id, m.number, s.product_id, s.quantity, s.price_per_tile, s.amount
+        FROM sale s
+        JOIN sale_number_map m ON m.sale_key = COALESCE(s.sale_id, 'line-' || s.id)
+    """)
+    cursor.execute("DROP TABLE sale_number_map")
+
+    # Dropping sale also drops its indexes and version triggers
+    cursor.execute("DROP VIEW IF EXISTS sale_items")
+    cursor.execute("DROP TABLE sale")
+    cursor.execute("DELETE FROM table_versions WHERE name = 'sale'")
+
+    cursor.execute("""
+    CREATE VIEW sale_items AS
+    SELECT l.id, s.id AS sale_id, s.customer_name, s.customer_phone_number, l.product_id,
+           p.name AS item_name, p.tile_type, p.interlock_subtype, p.interlock_size, p.color,
+           l.quantity, l.price_per_tile, l.amount, s.payment_mode, s.date
+    FROM sale_lines l
+    JOIN sales s ON s.id = l.sale_id
+    JOIN products p ON p.id = l.product_id
+    """)
+
+    # Header pages and finder: by date (rowid = invoice number breaks ties), customer, phone
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_phone ON sales(customer_phone_number COLLATE NOCASE)")
+    # Lines of one invoice, sold-per-SKU sums
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_sale ON sale_lines(sale_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_product ON sale_lines(product_id, quantity)")
+    track_versions(cursor, "sales", "sale_lines")
+
+    # Archived PDFs were keyed by the old UUID; they re-render on next view
+    cursor.execute("DROP TABLE invoices")
+    cursor.execute("""
+    CREATE TABLE invoices (
+        sale_id INTEGER PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        pdf BLOB NOT NULL,
+        rendered_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(sale_id) REFERENCES sales(id)
+    )
+    """)
+
+# Money columns, REAL rupees until _money_to_paise made them INTEGER paise
+MONEY_COLUMNS = {
+    "daily_log": ("labour_charge",),
+    "labour_payments": ("amount",),
+    "materials": ("price_per_unit", "total_price"),
+    "material_payments": ("amount",),
+    "sale_lines": ("price_per_tile", "amount"),
+    "ledger_totals": ("labour_charges", "labour_paid", "material_expense", "material_paid", "sales_amount"),
+    "rollup_daily": ("revenue", "labour_charge", "material_spend"),
+    "rollup_monthly": ("revenue", "labour_charge", "material_spend"),
+}
+
+def _money_to_paise(cursor):
+    """Rebuild every table with money in it to store INTEGER paise instead of REAL rupees."""
+    # Renaming a table fails while a view still names the dropped original,
+    # so views are dropped first and re-created from their own SQL at the end
+    views = cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall()
+    for name, _ in views:
+        cursor.execute(f"DROP VIEW {name}")
+
+    for table, money in MONEY_COLUMNS.items():
+        create = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        indexes = [sql for (sql,) in cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        ).fetchall()]
+
+        create = re.sub(r'^CREATE TABLE\s+("?)\w+\1', f"CREATE TABLE {table}_new", create.strip(), count=1)
+        for col in money:
+            create, found = re.subn(rf"\b{col}\s+REAL\b", f"{col} INTEGER", create)
+            if found != 1:
+                raise RuntimeError(f"{table}.{col} is not a REAL column")
+
+        columns = table_columns(cursor.connection, table)
+        cursor.execute(create)
+        cursor.execute(f"""
+            INSERT INTO {table}_new ({', '.join(columns)})
+            SELECT {', '.join(f"CAST(ROUND({col} * 100) AS INTEGER)" if col in money else col for col in columns)}
+            FROM {table}
+        """)
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        for sql in indexes:
+            cursor.execute(sql)
+
+    # Dropping the originals dropped their version triggers
+    track_versions(cursor, *MONEY_COLUMNS)
+    for _, sql in views:
+        cursor.execute(sql)
+
+def fill_derived(cursor):
+    """Recompute every derived table from history with the current code (caller commits)."""
+    fill_stock(cursor)
+    fill_totals(cursor)
+    fill_rollups(cursor)
+
+MIGRATIONS = [
+    _create_base_tables,
+    _add_products,
+    _add_indexes,
+    _add_table_versions,
+    _add_ledger_totals,
+    _add_rollups,
+    _add_history_indexes,
+    _add_invoices,
+    _add_customer_indexes,
+    _split_sales,
+    _money_to_paise,
+]
+
+@contextmanager
+def write_transaction(conn):
+    """``with write_transaction(conn) as cursor:`` runs the block under ``BEGIN IMMEDIATE``.
+
+    The write lock is held from the start, so whatever the block reads cannot
+    change before it writes. Commits at the end, rolls back if the block raises.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        yield cursor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version.
+
+    Several app processes may start on the same database at once. Each step
+    takes the write lock with ``BEGIN IMMEDIATE`` and re-reads user_version
+    under it, so a step another process has already applied is skipped
+    rather than run twice.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return len(MIGRATIONS)
+
+    # Table rebuilds drop and rename tables, which foreign keys would block;
+    # the setting only takes effect outside a transaction.
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        while True:
+            with write_transaction(conn) as cursor:
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    break
+                MIGRATIONS[version](cursor)
+                cursor.execute(f"PRAGMA user_version = {version + 1}")
+                if version + 1 == len(MIGRATIONS):
+                    # Migrations only reshape tables; derived tables are refilled
+                    # with the last step, so nobody sees a current schema without them.
+                    fill_derived(cursor)
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA optimize")
+    return len(MIGRATIONS)
+
+
+def init_db():
+    # The pool migrates the schema the first time it is created
+    get_pool()
     print("✅ tiles.db initialized with all tables.")
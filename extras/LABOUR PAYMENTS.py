@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from db import get_conn
+from db import UnitOfWork, get_conn
+from money import PAISE, Money
+from writer import NotSaved, write
 
 st.set_page_config(page_title="Labour Payments Dashboard", layout="wide")
 st.title("🧾 Labour Payments Dashboard")
@@ -11,11 +13,11 @@ cursor = conn.cursor()
 
 # --- Calculate totals from daily_log ---
 cursor.execute("SELECT SUM(labour_charge) FROM daily_log")
-total_charges = cursor.fetchone()[0] or 0.0   # includes loading also
+total_charges = Money(cursor.fetchone()[0])   # includes loading also
 
 # --- Calculate total paid ---
 cursor.execute("SELECT SUM(amount) FROM labour_payments")
-total_paid = cursor.fetchone()[0] or 0.0      # only real cash payments
+total_paid = Money(cursor.fetchone()[0])      # only real cash payments
 
 # --- Balance ---
 balance = total_charges - total_paid
@@ -31,22 +33,27 @@ st.markdown("---")
 # --- Add new payment form ---
 with st.expander("➕ Add New Payment"):
     payment_date = st.date_input("Payment Date")
-    amount = st.number_input("Amount Paid", min_value=0.0, value=0.0)
+    amount = Money.from_rupees(st.number_input("Amount Paid", min_value=0.0, value=0.0))
     purpose = st.text_input("Purpose (optional)")
     
     if st.button("Add Payment"):
-        cursor.execute(
-            "INSERT INTO labour_payments(date, amount, purpose) VALUES(?,?,?)",
-            (str(payment_date), amount, purpose)
-        )
-        conn.commit()
-        st.success(f"✅ Payment of ₹ {amount:,.2f} added!")
+        # Same path as the Labour Payments tab, so ledger_totals and caches stay current
+        uow = UnitOfWork()
+        uow.insert("labour_payments", date=str(payment_date), amount=amount, purpose=purpose)
+        uow.add_totals(labour_paid=amount)
+        try:
+            write(uow.flush, tables=uow.tables)
+        except NotSaved as exc:
+            st.error(f"❌ {exc}")
+        else:
+            st.success(f"✅ Payment of ₹ {amount:,.2f} added!")
 
 st.markdown("---")
 
 # --- Display all payments ---
 st.subheader("📋 Payment History")
 df_payments = pd.read_sql("SELECT * FROM labour_payments ORDER BY date DESC", conn)
+df_payments["amount"] = df_payments["amount"] / PAISE
 st.dataframe(df_payments, use_container_width=True)
 
 conn.close()
@@ -0,0 +1,390 @@
+"""Bulk import of historical records from CSV or Excel files.
+
+    python importer.py daily_log production_2019.csv
+    python importer.py sales sales_2019.xlsx --errors bad_sales.csv
+    python importer.py materials purchases.csv
+    python importer.py material_payments vendor_payments.csv
+    python importer.py labour_payments labour.csv
+
+Files are streamed and written in chunks of ``CHUNK_SIZE`` rows. Each chunk
+is one ``BEGIN IMMEDIATE`` transaction with one ``executemany`` per table, so
+memory stays flat however long the file is and the app keeps working in
+between chunks. A row that fails validation is written to the errors file
+(default ``<file>.errors.csv``) with its line number and the reason, and the
+load carries on. Stock, ledger totals and rollups are refilled once from the
+full history at the end instead of being adjusted row by row.
+
+Columns are matched by header name, case-insensitively:
+
+    daily_log          log_date, category, tile_type, interlock_subtype,
+                       interlock_size, color, quantity, labour_charge
+    sales              invoice, date, customer_name, customer_phone_number,
+                       payment_mode, tile_type, interlock_subtype,
+                       interlock_size, color, quantity, price_per_tile, [amount]
+    materials          date, vendor, material_type, quantity, unit,
+                       price_per_unit, [total_price]
+    material_payments  date, vendor, amount
+    labour_payments    date, amount, [purpose]
+
+Daily log categories are those the app logs (Tile, Loading, Pot). Tile
+rows must name a SKU the Daily Log offers (``-`` or blank for the subtype
+and size of 1x1 tiles); SKUs not yet in the catalog are added. Money
+columns are rupees (``₹`` and thousands separators are allowed) and are
+stored as whole paise. Vendors must already exist. Sales rows sharing an
+``invoice`` value become the lines of one sale, wherever they appear in
+the file; without that column every row is its own sale.
+"""
+import argparse
+import csv
+import sys
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from pathlib import Path
+
+from db import UnitOfWork, fill_derived, get_conn, write_transaction
+from money import Money
+from products import (
+    COLORS, INTERLOCK_SIZES, INTERLOCK_SUBTYPES, LOG_CATEGORIES, PRODUCT_KEY, TILE_TYPES, get_product_id,
+    is_valid_product,
+)
+
+CHUNK_SIZE = 5000
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S")
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message says why."""
+
+
+# ------------------------ READING ------------------------
+def read_rows(path):
+    """Yield ``(line number, {column: value})`` for every data row of a CSV or XLSX file."""
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        yield from _read_xlsx(path)
+        return
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        for line, values in enumerate(reader, start=2):
+            if any(value.strip() for value in values):
+                yield line, dict(zip(header, values))
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Importing Excel files needs openpyxl: pip install openpyxl") from None
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(name or "").strip().lower() for name in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, "") for value in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+# ------------------------ FIELD PARSING ------------------------
+def _text(row, column, required=True, default=""):
+    value = row.get(column)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise RowError(f"{column} is missing")
+        return default
+    return value
+
+
+def _number(row, column, integer=False, required=True):
+    value = row.get(column)
+    if value is None or str(value).strip() == "":
+        if required:
+            raise RowError(f"{column} is missing")
+        return None
+    try:
+        number = float(str(value).replace(",", "").replace("₹", "").strip())
+    except ValueError:
+        raise RowError(f"{column} is not a number: {value!r}") from None
+    if number < 0:
+        raise RowError(f"{column} is negative: {value!r}")
+    if integer:
+        if not number.is_integer():
+            raise RowError(f"{column} is not a whole number: {value!r}")
+        return int(number)
+    return number
+
+
+def _money(row, column, required=True):
+    """A rupee amount as ``Money`` (paise), or None when optional and blank."""
+    number = _number(row, column, required=required)
+    return None if number is None else Money.from_rupees(number)
+
+
+def _date(row, column, with_time=False):
+    """``YYYY-MM-DD`` (or ``YYYY-MM-DD HH:MM:SS`` with ``with_time``), as the app stores it."""
+    value = row.get(column)
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, datetime.min.time())
+    else:
+        text = _text(row, column)
+        for fmt in DATETIME_FORMATS + DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise RowError(f"{column} is not a date: {text!r}")
+    return parsed.strftime("%Y-%m-%d %H:%M:%S" if with_time else "%Y-%m-%d")
+
+
+# ------------------------ IMPORTERS ------------------------
+class Importer(ABC):
+    """Validates rows of one kind and queues them on a ``UnitOfWork``."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def begin_chunk(self, cursor):
+        self.cursor = cursor
+
+    @abstractmethod
+    def add(self, uow, row):
+        """Queue ``row`` on ``uow``, or raise ``RowError``."""
+
+
+# Spreadsheet spellings are matched to the catalog's case-insensitively
+PRODUCT_NAMES = {name.lower(): name for name in (*TILE_TYPES, *INTERLOCK_SUBTYPES, *INTERLOCK_SIZES, *COLORS)}
+
+
+class ProductImporter(Importer):
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.products = {
+            tuple(key): product_id
+            for product_id, *key in conn.execute(f"SELECT id, {', '.join(PRODUCT_KEY)} FROM products")
+        }
+
+    def product_id(self, row):
+        key = tuple(
+            PRODUCT_NAMES.get(value.lower(), value)
+            for value in (_text(row, col, required=col in ("tile_type", "color"), default="-") for col in PRODUCT_KEY)
+        )
+        product_id = self.products.get(key)
+        if product_id is None:
+            if not is_valid_product(*key):
+                raise RowError(f"unknown product: {' / '.join(key)}")
+            product_id = self.products[key] = get_product_id(self.cursor, *key)
+        return product_id
+
+
+class DailyLogImporter(ProductImporter):
+    def add(self, uow, row):
+        category = _text(row, "category").title()
+        if category not in LOG_CATEGORIES:
+            raise RowError(f"unknown category: {category} (expected {', '.join(LOG_CATEGORIES)})")
+        product_id = self.product_id(row) if category == "Tile" else None
+        uow.insert(
+            "daily_log", category=category, product_id=product_id,
+            quantity=_number(row, "quantity", integer=True),
+            labour_charge=_money(row, "labour_charge"),
+            log_date=_date(row, "log_date"),
+        )
+
+
+class SalesImporter(ProductImporter):
+    def __init__(self, conn):
+        super().__init__(conn)
+        # Invoice refs already seen -> sale id, kept in SQLite rather than in memory
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_invoices (ref TEXT PRIMARY KEY, sale_id INTEGER)")
+        conn.execute("DELETE FROM import_invoices")
+        conn.commit()
+
+    def begin_chunk(self, cursor):
+        # Ids are assigned here so headers can be batched; the chunk holds the write lock
+        super().begin_chunk(cursor)
+        self.next_id = cursor.execute("""
+            SELECT MAX(IFNULL((SELECT MAX(id) FROM sales), 0),
+                       IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'sales'), 0))
+        """).fetchone()[0] + 1
+
+    def add(self, uow, row):
+        product_id = self.product_id(row)
+        quantity = _number(row, "quantity", integer=True)
+        price = _money(row, "price_per_tile")
+        amount = _money(row, "amount", required=False)
+        ref = _text(row, "invoice", required=False)
+        found = ref and self.cursor.execute("SELECT sale_id FROM import_invoices WHERE ref = ?", (ref,)).fetchone()
+
+        if found:
+            sale_id = found[0]
+        else:
+            header = dict(
+                customer_name=_text(row, "customer_name"),
+                customer_phone_number=_text(row, "customer_phone_number", required=False),
+                payment_mode=_text(row, "payment_mode", required=False, default="Cash"),
+                date=_date(row, "date", with_time=True),
+            )
+            sale_id = self.next_id
+            self.next_id += 1
+            uow.insert("sales", id=sale_id, **header)
+            if ref:
+                self.cursor.execute("INSERT INTO import_invoices (ref, sale_id) VALUES (?, ?)", (ref, sale_id))
+
+        uow.insert(
+            "sale_lines", sale_id=sale_id, product_id=product_id, quantity=quantity,
+            price_per_tile=price, amount=price * quantity if amount is None else amount,
+        )
+
+
+class VendorImporter(Importer):
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.vendors = {name.strip().lower(): vendor_id for vendor_id, name in conn.execute("SELECT id, name FROM vendors")}
+
+    def vendor_id(self, row):
+        name = _text(row, "vendor")
+        vendor_id = self.vendors.get(name.lower())
+        if vendor_id is None:
+            raise RowError(f"unknown vendor: {name}")
+        return vendor_id
+
+
+class MaterialsImporter(VendorImporter):
+    def add(self, uow, row):
+        quantity = _number(row, "quantity")
+        price = _money(row, "price_per_unit")
+        total = _money(row, "total_price", required=False)
+        uow.insert(
+            "materials", date=_date(row, "date"), material_type=_text(row, "material_type"),
+            quantity=quantity, unit=_text(row, "unit", required=False, default="bags"),
+            price_per_unit=price, total_price=price * quantity if total is None else total,
+            vendor_id=self.vendor_id(row),
+        )
+
+
+class MaterialPaymentsImporter(VendorImporter):
+    def add(self, uow, row):
+        uow.insert(
+            "material_payments", vendor_id=self.vendor_id(row),
+            date=_date(row, "date"), amount=_money(row, "amount"),
+        )
+
+
+class LabourPaymentsImporter(Importer):
+    def add(self, uow, row):
+        uow.insert(
+            "labour_payments", date=_date(row, "date"), amount=_money(row, "amount"),
+            purpose=_text(row, "purpose", required=False),
+        )
+
+
+IMPORTERS = {
+    "daily_log": DailyLogImporter,
+    "sales": SalesImporter,
+    "materials": MaterialsImporter,
+    "material_payments": MaterialPaymentsImporter,
+    "labour_payments": LabourPaymentsImporter,
+}
+
+
+# ------------------------ LOADING ------------------------
+class ErrorLog:
+    """Bad rows written to CSV as they are found: line, reason, then the row itself."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def add(self, line, reason, row):
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._columns = list(row)
+            self._writer.writerow(["line", "error", *self._columns])
+        self._writer.writerow([line, reason, *(row.get(col, "") for col in self._columns)])
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _flush_chunk(conn, importer, chunk, errors):
+    with write_transaction(conn) as cursor:
+        # UnitOfWork writes tables in the order they were first queued, so a chunk
+        # that opens with a line of an earlier chunk's invoice queues sale_lines
+        # before the headers of its new invoices; check the keys at commit instead.
+        cursor.execute("PRAGMA defer_foreign_keys=ON")
+        importer.begin_chunk(cursor)
+        uow = UnitOfWork()
+        imported = 0
+        for line, row in chunk:
+            try:
+                importer.add(uow, row)
+                imported += 1
+            except RowError as exc:
+                errors.add(line, str(exc), row)
+        uow.flush(cursor)
+    return imported
+
+
+def import_file(conn, kind, path, errors_path=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Load ``path`` into ``kind``; returns ``(rows imported, bad rows)``.
+
+    ``progress(rows read)`` is called after every chunk.
+    """
+    importer = IMPORTERS[kind](conn)
+    errors = ErrorLog(errors_path or Path(path).with_suffix(".errors.csv"))
+    imported = read = 0
+    try:
+        chunk = []
+        for line, row in read_rows(path):
+            chunk.append((line, row))
+            if len(chunk) >= chunk_size:
+                imported += _flush_chunk(conn, importer, chunk, errors)
+                read += len(chunk)
+                chunk = []
+                if progress:
+                    progress(read)
+        if chunk:
+            imported += _flush_chunk(conn, importer, chunk, errors)
+            read += len(chunk)
+            if progress:
+                progress(read)
+    finally:
+        errors.close()
+        # Derived tables are refilled once from the full history, also after a
+        # failed load so the chunks it did commit are counted. The write lock
+        # is taken before the history is read, so a save the app commits
+        # meanwhile cannot fall between the read and the replace.
+        with write_transaction(conn) as cursor:
+            fill_derived(cursor)
+    return imported, errors.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import historical records from CSV or Excel.")
+    parser.add_argument("kind", choices=IMPORTERS)
+    parser.add_argument("path")
+    parser.add_argument("--errors", help="where to write rejected rows (default: <file>.errors.csv)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    imported, bad = import_file(
+        get_conn(), args.kind, args.path, args.errors, args.chunk_size,
+        progress=lambda read: print(f"   {read:,} rows read", end="\r"),
+    )
+    print(f"✅ {imported:,} {args.kind} rows imported")
+    if bad:
+        print(f"⚠️ {bad:,} rows rejected, see {args.errors or Path(args.path).with_suffix('.errors.csv')}")
+    sys.exit(1 if bad else 0)
@@ -1,36 +1,53 @@
-import sqlite3
-
-# Connect to your database
-conn = sqlite3.connect("data/tiles.db")
-cur = conn.cursor()
-
-# Create the tile_stock table if it doesn't exist
-cur.execute("""
-CREATE TABLE IF NOT EXISTS tile_stock (
-    tile_type TEXT,
-    interlock_subtype TEXT,
-    interlock_size TEXT,
-    color TEXT,
-    available_qty INTEGER,
-    PRIMARY KEY (tile_type, interlock_subtype, interlock_size, color)
-)
-""")
-conn.commit()
-
-# Optional: clear existing stock
-cur.execute("DELETE FROM tile_stock")
-conn.commit()
-
-# Initialize stock from daily_log
-cur.execute("""
-INSERT INTO tile_stock (tile_type, interlock_subtype, interlock_size, color, available_qty)
-SELECT tile_type, interlock_subtype, interlock_size, color, SUM(quantity)
-FROM daily_log
-WHERE category='Tile'
-GROUP BY tile_type, interlock_subtype, interlock_size, color
-""")
-conn.commit()
-
-print("✅ tile_stock initialized from daily_log")
-
-conn.close()
+"""Verify the derived tables against the full history and repair any drift.
+
+    python initdb.py            # verify, rebuild whatever has drifted
+    python initdb.py --check    # verify only, exit 1 on drift
+    python initdb.py --rebuild  # backfill every derived table from scratch
+"""
+import sys
+
+from db import get_conn, init_db
+from ledger import rebuild_rollups, rebuild_totals, verify_rollups, verify_totals
+from stock import rebuild_stock, verify_stock
+
+# (table, verify(conn) -> [(key, stored, expected)], rebuild(conn))
+DERIVED = [
+    ("tile_stock", verify_stock, rebuild_stock),
+    ("ledger_totals", verify_totals, rebuild_totals),
+    ("rollup_daily / rollup_monthly", verify_rollups, rebuild_rollups),
+]
+
+init_db()
+conn = get_conn()
+check_only = "--check" in sys.argv
+force_rebuild = "--rebuild" in sys.argv
+failed = False
+
+for table, verify, rebuild in DERIVED:
+    if force_rebuild:
+        rebuild(conn)
+        print(f"✅ {table} rebuilt from history")
+        continue
+
+    mismatches = verify(conn)
+    if not mismatches:
+        print(f"✅ {table} matches history")
+        continue
+
+    print(f"⚠️ {table} differs from history in {len(mismatches)} row(s):")
+    for key, stored, expected in mismatches:
+        print(f"   {key}: stored={stored} expected={expected}")
+
+    if check_only:
+        failed = True
+        continue
+
+    rebuild(conn)
+    remaining = verify(conn)
+    if remaining:
+        print(f"❌ {table} still differs in {len(remaining)} row(s) after rebuild")
+        failed = True
+    else:
+        print(f"✅ {table} rebuilt from history")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,382 @@
+"""Invoice PDFs, rendered once per sale and archived in the ``invoices`` table.
+
+Each archived PDF is stored with a hash of the sale rows it was drawn from.
+Viewing or downloading an invoice re-hashes those rows (one indexed lookup)
+and streams the stored bytes; only a new or edited sale is rendered again.
+Bulk exports render whatever is missing across a process pool.
+"""
+import hashlib
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from itertools import chain
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from money import Money
+
+# Register font for Unicode (₹ symbol); once per process, on first import
+font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+if os.path.exists(font_path):
+    pdfmetrics.registerFont(TTFont("DejaVuSans", font_path))
+    FONT_NAME = "DejaVuSans"
+else:
+    FONT_NAME = "Helvetica"
+
+COMPANY_NAME = "Tiles Factory Seeloo"
+COMPANY_ADDRESS = "Near Hi Five Agro Skills, Seeloo, Sopore"
+COMPANY_PHONE = "+91-7006363824"
+
+# Part of every content hash: bump it when the layout changes so archived
+# invoices are re-rendered on their next view.
+LAYOUT_VERSION = 3
+
+INVOICE_ROWS_QUERY = """
+    SELECT item_name, price_per_tile, quantity, amount,
+           customer_name, customer_phone_number, payment_mode, date
+    FROM sale_items
+    WHERE sale_id = ?
+    ORDER BY id
+"""
+
+
+# ------------------ PDF GENERATION ------------------
+def generate_invoice_pdf(items, customer_name, customer_phone, payment_mode, sale_date, sale_id):
+    """Render one invoice; ``items`` is an iterable of (item name, price per tile, quantity, amount).
+
+    Prices and amounts are in paise, as stored.
+    """
+    buffer = BytesIO()
+    write_invoice_pdf(buffer, items, customer_name, customer_phone, payment_mode, sale_date, sale_id)
+    return buffer.getvalue()
+
+
+def write_invoice_pdf(out, items, customer_name, customer_phone, payment_mode, sale_date, sale_id):
+    """Render one invoice straight into ``out`` (a path or binary file object)."""
+    c = canvas.Canvas(out, pagesize=A4)
+    draw_invoice(c, items, customer_name, customer_phone, payment_mode, sale_date, sale_id)
+    c.save()
+
+
+# ---- Page layout (fixed, computed once) ----
+WIDTH, HEIGHT = A4
+BILL_TO_Y = HEIGHT - 140
+BOX_TOP = BILL_TO_Y - 80
+BOX_HEIGHT = 300
+BOX_WIDTH = WIDTH - 100
+START_X = 50
+START_Y = BOX_TOP - BOX_HEIGHT
+COL_WIDTHS = [BOX_WIDTH * 0.4, BOX_WIDTH * 0.2, BOX_WIDTH * 0.2, BOX_WIDTH * 0.2]
+X_POSITIONS = [START_X + sum(COL_WIDTHS[:i]) for i in range(len(COL_WIDTHS) + 1)]
+HEADER_LINE_Y = BOX_TOP - 25
+ROW_HEIGHT = 20
+TOTAL_Y = START_Y + 20
+# Item rows that fit between the header line and the total row
+ROWS_PER_PAGE = int((HEADER_LINE_Y - 20 - (TOTAL_Y + 25)) // ROW_HEIGHT) + 1
+
+TEMPLATE_FORM = "invoice_page"
+
+
+def draw_static(c):
+    """Everything on an invoice page that does not depend on the sale."""
+    # ---- Watermark ----
+    c.saveState()
+    c.setFont(FONT_NAME, 60)
+    c.setFillColorRGB(0.9, 0.9, 0.9)  # Light gray watermark
+    c.translate(WIDTH / 2, HEIGHT / 2)
+    c.rotate(45)
+    c.drawCentredString(0, 0, "TILE FACTORY SEELOO")
+    c.restoreState()
+
+    # ---- Page Border ----
+    c.setStrokeColorRGB(0.6, 0.6, 0.6)
+    c.setLineWidth(0.7)
+    c.rect(30, 30, WIDTH - 60, HEIGHT - 60)
+
+    # ---- Header ----
+    c.setFont(FONT_NAME, 14)
+    c.drawString(50, HEIGHT - 50, COMPANY_NAME)
+    c.setFont(FONT_NAME, 10)
+    c.drawString(50, HEIGHT - 65, COMPANY_ADDRESS)
+    c.drawString(50, HEIGHT - 80, f"Phone: {COMPANY_PHONE}")
+
+    c.setFont(FONT_NAME, 16)
+    c.drawRightString(WIDTH - 50, HEIGHT - 50, "INVOICE")
+
+    c.setFont(FONT_NAME, 11)
+    c.drawString(50, BILL_TO_Y, "Bill To:")
+
+    # ---- Items Box ----
+    c.rect(START_X, START_Y, BOX_WIDTH, BOX_HEIGHT)
+    for x in X_POSITIONS:
+        c.line(x, START_Y, x, BOX_TOP)
+
+    headers = ["ITEM NAME", "UNIT PRICE(Rs)", "Quantity(No)", "TOTAL(Rs)"]
+    c.setFont(FONT_NAME, 10)
+    for i, h in enumerate(headers):
+        c.drawString(X_POSITIONS[i] + 5, BOX_TOP - 15, h)
+    c.line(START_X, HEADER_LINE_Y, START_X + BOX_WIDTH, HEADER_LINE_Y)
+
+    # ---- Total Row (label and amount are per page) ----
+    c.line(START_X, TOTAL_Y + 20, START_X + BOX_WIDTH, TOTAL_Y + 20)
+
+    # ---- Footer ----
+    c.setFont(FONT_NAME, 10)
+    c.drawRightString(WIDTH - 50, 60, "Additional Information/Comments:")
+    c.drawRightString(WIDTH - 50, 40, "Authorized Signatory")
+
+
+def stamp_template(c):
+    """Place the static layout on the current page.
+
+    It is compiled into a form XObject the first time a document uses it, so
+    every further page of that document (bulk exports, long invoices) only
+    references it instead of redrawing it.
+    """
+    if not c.hasForm(TEMPLATE_FORM):
+        c.beginForm(TEMPLATE_FORM)
+        draw_static(c)
+        c.endForm()
+    c.doForm(TEMPLATE_FORM)
+
+
+def draw_invoice(c, items, customer_name, customer_phone, payment_mode, sale_date, sale_id):
+    """Draw one invoice onto canvas ``c``, flowing ``items`` over as many pages as needed.
+
+    Items are consumed one at a time, so a long order is never held in
+    memory. Every page repeats the header and table headings; a page that
+    runs out of rows ends with a carried-forward subtotal, which the next
+    page opens with.
+    """
+    page = 1
+    total = Money()
+    y_pos = _start_page(c, page, customer_name, customer_phone, payment_mode, sale_date, sale_id)
+    rows_left = ROWS_PER_PAGE
+
+    for item_name, price_per_tile, quantity, amount in items:
+        if rows_left == 0:
+            _finish_page(c, "Carried Forward:", total)
+            page += 1
+            y_pos = _start_page(c, page, customer_name, customer_phone, payment_mode, sale_date, sale_id)
+            _draw_row(c, y_pos, ["Brought Forward", "", "", f"{total:.2f}"])
+            y_pos -= ROW_HEIGHT
+            rows_left = ROWS_PER_PAGE - 1
+
+        _draw_row(c, y_pos, [item_name, f"{Money(price_per_tile):.2f}", str(quantity), f"{Money(amount):.2f}"])
+        y_pos -= ROW_HEIGHT
+        rows_left -= 1
+        total += amount
+
+    _finish_page(c, "Total Amount:", total)
+
+
+def _start_page(c, page, customer_name, customer_phone, payment_mode, sale_date, sale_id):
+    """Stamp the template and the sale's header fields; return the first row's y."""
+    stamp_template(c)
+
+    c.setFont(FONT_NAME, 10)
+    c.drawRightString(WIDTH - 50, HEIGHT - 80, f"Invoice #: {sale_id}")
+    c.drawRightString(WIDTH - 50, HEIGHT - 95, f"Date: {sale_date}")
+    if page > 1:
+        c.drawRightString(WIDTH - 50, HEIGHT - 110, f"Page {page} (continued)")
+
+    # ---- Bill To ----
+    c.drawString(50, BILL_TO_Y - 15, f"{customer_name}")
+    c.drawString(50, BILL_TO_Y - 30, f"Phone: {customer_phone}")
+    c.drawString(50, BILL_TO_Y - 45, f"Payment Mode: {payment_mode}")
+    return HEADER_LINE_Y - 20
+
+
+def _draw_row(c, y_pos, values):
+    c.setFont(FONT_NAME, 10)
+    for i, val in enumerate(values):
+        c.drawString(X_POSITIONS[i] + 5, y_pos, val)
+
+
+def _finish_page(c, label, amount):
+    c.setFont(FONT_NAME, 11)
+    c.drawString(START_X + 5, TOTAL_Y + 5, label)
+    c.drawRightString(START_X + BOX_WIDTH - 5, TOTAL_Y + 5, f"{amount:.2f}")
+    c.showPage()
+
+
+# ------------------ ARCHIVE ------------------
+ARCHIVE_UPSERT = """
+    INSERT INTO invoices (sale_id, content_hash, pdf) VALUES (?, ?, ?)
+    ON CONFLICT (sale_id) DO UPDATE SET
+        content_hash = excluded.content_hash,
+        pdf = excluded.pdf,
+        rendered_at = CURRENT_TIMESTAMP
+"""
+
+
+def _archive(cursor, rendered):
+    # Writer command: upsert [(sale_id, content_hash, pdf)]
+    cursor.executemany(ARCHIVE_UPSERT, rendered)
+
+
+def save_to_archive(rendered):
+    """Upsert ``[(sale_id, content_hash, pdf)]`` on the writer thread, like every other save."""
+    # Imported here, not at the top: process pool workers import this module
+    # and only need to render.
+    from writer import NotSaved, write
+    try:
+        write(_archive, rendered, tables=("invoices",))
+    except NotSaved:
+        pass  # the archive is only a cache; these are rendered again next time
+
+
+def content_hash(rows):
+    """Hash of the layout version and ``rows``, consumed one row at a time."""
+    digest = hashlib.sha256(repr(LAYOUT_VERSION).encode())
+    for row in rows:
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def invoice_fields(rows):
+    """Split ``INVOICE_ROWS_QUERY`` rows into (items iterator, customer, phone, payment mode, date)."""
+    rows = iter(rows)
+    first = next(rows)
+    customer_name, customer_phone, payment_mode, sale_date = first[4:]
+    items = (row[:4] for row in chain([first], rows))
+    return items, customer_name, customer_phone, payment_mode, sale_date
+
+
+def render_sale(sale_id, rows):
+    """Render ``rows`` (any iterable, e.g. a cursor) as returned by ``INVOICE_ROWS_QUERY``."""
+    return generate_invoice_pdf(*invoice_fields(rows), sale_id)
+
+
+def get_invoice_pdf(conn, sale_id):
+    """PDF bytes for ``sale_id``, rendered and archived only if the sale changed."""
+    rows = conn.execute(INVOICE_ROWS_QUERY, (sale_id,))
+    first = rows.fetchone()
+    if first is None:
+        return None
+
+    digest = content_hash(chain([first], rows))
+    stored = conn.execute(
+        "SELECT pdf FROM invoices WHERE sale_id = ? AND content_hash = ?", (sale_id, digest)
+    ).fetchone()
+    if stored:
+        return stored[0]
+
+    # Stream the rows again straight from the cursor into the renderer
+    pdf = render_sale(sale_id, conn.execute(INVOICE_ROWS_QUERY, (sale_id,)))
+    save_to_archive([(sale_id, digest, pdf)])
+    return pdf
+
+
+# ------------------ BULK EXPORT ------------------
+EXPORT_ROWS_QUERY = """
+    SELECT sale_id, item_name, price_per_tile, quantity, amount,
+           customer_name, customer_phone_number, payment_mode, date
+    FROM sale_items
+    WHERE date >= ? AND date < ? {customer}
+    ORDER BY date, sale_id, id
+"""
+
+# Below this many invoices to render, a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
+
+def find_sales(conn, start, end, customer=None):
+    """``{sale_id: rows}`` for every sale from ``start`` to ``end`` (inclusive), oldest first."""
+    # Imported here, not at the top: process pool workers import this module
+    # and only need to render.
+    from utils import prefix_condition
+
+    params = [str(start), str(end + timedelta(days=1))]
+    customer_sql = ""
+    if customer:
+        condition, values = prefix_condition("customer_name", customer)
+        customer_sql = f"AND {condition}"
+        params.extend(values)
+
+    sales = {}
+    for sale_id, *row in conn.execute(EXPORT_ROWS_QUERY.format(customer=customer_sql), params):
+        sales.setdefault(sale_id, []).append(tuple(row))
+    return sales
+
+
+def _render_job(job):
+    # Module-level so the process pool can pickle it
+    sale_id, rows = job
+    return sale_id, render_sale(sale_id, rows)
+
+
+def archive_invoices(conn, sales, progress=None, max_workers=None):
+    """Bring the archive up to date for ``sales`` and return ``{sale_id: pdf}``.
+
+    Invoices whose hash still matches are read back as-is; the rest are
+    rendered across a process pool and archived in one write.
+    ``progress(done, total)`` is called as invoices become available.
+    """
+    digests = {sale_id: content_hash(rows) for sale_id, rows in sales.items()}
+    sale_ids = list(sales)
+    pdfs = {}
+    for i in range(0, len(sale_ids), 500):
+        chunk = sale_ids[i:i + 500]
+        marks = ", ".join("?" for _ in chunk)
+        for sale_id, digest, pdf in conn.execute(
+            f"SELECT sale_id, content_hash, pdf FROM invoices WHERE sale_id IN ({marks})", chunk
+        ):
+            if digests[sale_id] == digest:
+                pdfs[sale_id] = pdf
+
+    total = len(sales)
+    if progress:
+        progress(len(pdfs), total)
+
+    stale = [(sale_id, sales[sale_id]) for sale_id in sale_ids if sale_id not in pdfs]
+    rendered = []
+
+    def collect(results):
+        for sale_id, pdf in results:
+            pdfs[sale_id] = pdf
+            rendered.append((sale_id, digests[sale_id], pdf))
+            if progress:
+                progress(len(pdfs), total)
+
+    if len(stale) < POOL_THRESHOLD:
+        collect(map(_render_job, stale))
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        # Not fork: the Streamlit server is multi-threaded (tornado, the writer
+        # thread, pooled connections) and a forked child can inherit a held lock.
+        # Workers only need this module to render.
+        context = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            collect(pool.map(_render_job, stale, chunksize=max(1, len(stale) // (workers * 4))))
+
+    if rendered:
+        save_to_archive(rendered)
+    return {sale_id: pdfs[sale_id] for sale_id in sale_ids}
+
+
+def zip_invoices(pdfs, docs=None):
+    """ZIP of ``{sale_id: pdf}``, plus ``{sale_id: docx}`` Word copies if given."""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for sale_id, pdf in pdfs.items():
+            archive.writestr(f"Invoice_{sale_id}.pdf", pdf)
+        for sale_id, doc in (docs or {}).items():
+            archive.writestr(f"Invoice_{sale_id}.docx", doc)
+    return buffer.getvalue()
+
+
+def merged_invoices_pdf(sales):
+    """One PDF with every sale in ``sales`` on its own page(s)."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for sale_id, rows in sales.items():
+        draw_invoice(c, *invoice_fields(rows), sale_id)
+    c.save()
+    return buffer.getvalue()
@@ -0,0 +1,171 @@
+"""Word invoices mail-merged from ``invoice_template_final.docx``.
+
+The template is edited in Word, not in code. It uses ``{{NAME}}``
+placeholders and one item-table row whose cells are all ``{{ITEMS_TABLE}}``
+(item name, unit price, quantity, total). That row is repeated once per
+sale line, eating into the empty filler rows below it.
+
+A template is compiled once into literal XML fragments plus the bytes of
+every other part of the package, and cached until the file changes on disk.
+Merging a sale is then string joins and one zip write; nothing is parsed
+per invoice. ``get_invoice_docx`` keeps recent merges keyed by the same
+content hash as the archived PDFs, so rerunning the invoice tab only merges
+again after the sale or the template changes.
+"""
+import os
+import re
+import threading
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from invoice import COMPANY_ADDRESS, COMPANY_NAME, COMPANY_PHONE, INVOICE_ROWS_QUERY, content_hash, invoice_fields
+from money import Money
+
+TEMPLATE_PATH = Path("invoice_template_final.docx")
+
+DOCUMENT_PART = "word/document.xml"
+ITEMS_PLACEHOLDER = "{{ITEMS_TABLE}}"
+PLACEHOLDER = re.compile(r"\{\{([A-Z_]+)\}\}")
+ROW = re.compile(r"<w:tr[ >].*?</w:tr>", re.S)
+# Word requires paragraph ids to be unique; repeated rows simply drop them
+PARA_IDS = re.compile(r' w14:(?:paraId|textId)="[^"]*"')
+
+MERGED_CACHE_SIZE = 64  # merged invoices kept in memory
+
+
+def _compile_text(xml):
+    """Split ``xml`` into alternating literal text and placeholder names."""
+    parts = PLACEHOLDER.split(xml)
+    for literal in parts[::2]:
+        if "{{" in literal or "}}" in literal:
+            raise ValueError(
+                "Invoice template has a placeholder split by formatting; "
+                "retype it in Word without changing its style part-way."
+            )
+    return parts
+
+
+def _fill(parts, fields):
+    # Unknown placeholders render empty, so the template can grow fields first
+    return "".join(
+        part if i % 2 == 0 else escape(str(fields.get(part, "")))
+        for i, part in enumerate(parts)
+    )
+
+
+class DocxTemplate:
+    """A compiled invoice template: parse once, merge many."""
+
+    def __init__(self, path):
+        with zipfile.ZipFile(path) as package:
+            self._parts = [(info, package.read(info)) for info in package.infolist()]
+        document = dict((info.filename, data) for info, data in self._parts)[DOCUMENT_PART].decode("utf-8")
+
+        marker = document.find(ITEMS_PLACEHOLDER)
+        if marker == -1:
+            raise ValueError(f"Invoice template has no {ITEMS_PLACEHOLDER} row.")
+        rows = list(ROW.finditer(document))
+        index = next(i for i, row in enumerate(rows) if row.start() < marker < row.end())
+
+        # Empty rows right after the item row only reserve space on the page
+        fillers = []
+        for row in rows[index + 1:]:
+            if "<w:t>" in row.group() or "<w:t " in row.group():
+                break
+            fillers.append(row)
+
+        end = fillers[-1].end() if fillers else rows[index].end()
+        self._head = _compile_text(document[:rows[index].start()])
+        self._row = PARA_IDS.sub("", rows[index].group()).split(ITEMS_PLACEHOLDER)
+        self._fillers = [row.group() for row in fillers]
+        self._tail = _compile_text(document[end:])
+
+    def render(self, fields, items):
+        """DOCX bytes for ``fields`` (placeholder -> value) and an iterable of items (money in paise).
+
+        ``TOTAL_AMOUNT`` is filled from the items when ``fields`` leaves it out.
+        """
+        rows = []
+        total = Money()
+        for item_name, price_per_tile, quantity, amount in items:
+            values = [item_name, f"{Money(price_per_tile):.2f}", str(quantity), f"{Money(amount):.2f}"]
+            row = self._row[0]
+            for value, literal in zip(values, self._row[1:]):
+                row += escape(str(value)) + literal
+            rows.append(row)
+            total += amount
+        fields = {"TOTAL_AMOUNT": f"{total:.2f}", **fields}
+
+        document = (
+            _fill(self._head, fields)
+            + "".join(rows)
+            + "".join(self._fillers[max(len(rows) - 1, 0):])
+            + _fill(self._tail, fields)
+        )
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as package:
+            for info, data in self._parts:
+                package.writestr(info, document if info.filename == DOCUMENT_PART else data)
+        return buffer.getvalue()
+
+
+@lru_cache(maxsize=4)
+def _load(path, mtime):
+    return DocxTemplate(path)
+
+
+def get_template(path=TEMPLATE_PATH):
+    """The compiled template, recompiled only after the file is saved again."""
+    path = Path(path)
+    return _load(path, os.stat(path).st_mtime_ns)
+
+
+# ------------------ MERGE ------------------
+def render_sale_docx(sale_id, rows, template=None):
+    """Merge ``rows`` as returned by ``INVOICE_ROWS_QUERY`` into the invoice template."""
+    items, customer_name, customer_phone, payment_mode, sale_date = invoice_fields(rows)
+    fields = {
+        "COMPANY_NAME": COMPANY_NAME,
+        "COMPANY_ADDRESS": f"{COMPANY_NAME}, {COMPANY_ADDRESS} | Phone: {COMPANY_PHONE}",
+        "INVOICE_ID": sale_id,
+        "INVOICE_DATE": sale_date,
+        "CUSTOMER_NAME": customer_name,
+        "CUSTOMER_PHONE": customer_phone,
+        "PAYMENT_MODE": payment_mode,
+    }
+    return (template or get_template()).render(fields, items)
+
+
+def merge_sales(sales, template=None):
+    """``{sale_id: docx bytes}`` for ``{sale_id: rows}``, all from one compiled template."""
+    template = template or get_template()
+    return {sale_id: render_sale_docx(sale_id, rows, template) for sale_id, rows in sales.items()}
+
+
+# (sale_id, content hash, template) -> docx bytes, oldest first; a new
+# compiled template after an edit is a new key
+_merged = {}
+_merged_lock = threading.Lock()
+
+
+def get_invoice_docx(conn, sale_id):
+    """Word copy of ``sale_id``, merged only if the sale or the template changed."""
+    rows = conn.execute(INVOICE_ROWS_QUERY, (sale_id,)).fetchall()
+    if not rows:
+        return None
+
+    template = get_template()
+    key = (sale_id, content_hash(rows), template)
+    with _merged_lock:
+        docx = _merged.get(key)
+    if docx is None:
+        docx = render_sale_docx(sale_id, rows, template)
+        with _merged_lock:
+            while len(_merged) >= MERGED_CACHE_SIZE:
+                del _merged[next(iter(_merged))]
+            _merged[key] = docx
+    return docx
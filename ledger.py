@@ -0,0 +1,204 @@
+"""Materialized ledger totals and time-series rollups behind the dashboard.
+
+``ledger_totals`` holds a single row of running sums, and ``rollup_daily`` /
+``rollup_monthly`` hold per-SKU sums per period. Every write path adds its
+delta inside its own transaction, so KPI cards, balances and trend charts
+read a handful of pre-aggregated rows no matter how much history there is.
+Money is in integer paise (see ``money``), so stored and recomputed sums
+must match exactly.
+"""
+from collections import defaultdict
+
+TOTAL_COLUMNS = (
+    "labour_charges",     # SUM(daily_log.labour_charge)
+    "labour_paid",        # SUM(labour_payments.amount)
+    "material_expense",   # SUM(materials.total_price)
+    "material_paid",      # SUM(material_payments.amount)
+    "tiles_produced",     # SUM(daily_log.quantity) for Tile rows
+    "tiles_sold",         # SUM(sale_lines.quantity)
+    "sales_amount",       # SUM(sale_lines.amount)
+)
+
+TOTALS_QUERY = f"SELECT {', '.join(TOTAL_COLUMNS)} FROM ledger_totals WHERE id = 1"
+
+
+def apply_totals(cursor, **deltas):
+    """Add ``deltas`` (column=amount) to the running totals on the caller's cursor."""
+    unknown = set(deltas) - set(TOTAL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown ledger columns: {', '.join(sorted(unknown))}")
+    if not deltas:
+        return
+    assignments = ", ".join(f"{col} = {col} + ?" for col in deltas)
+    cursor.execute(f"UPDATE ledger_totals SET {assignments} WHERE id = 1", tuple(deltas.values()))
+
+
+def get_totals(conn):
+    return dict(zip(TOTAL_COLUMNS, conn.execute(TOTALS_QUERY).fetchone()))
+
+
+# ------------------------ REBUILD / REPAIR ------------------------
+def compute_totals(conn):
+    """Recompute every total from the base tables."""
+    row = conn.execute("""
+        SELECT
+            (SELECT IFNULL(SUM(labour_charge), 0) FROM daily_log),
+            (SELECT IFNULL(SUM(amount), 0) FROM labour_payments),
+            (SELECT IFNULL(SUM(total_price), 0) FROM materials),
+            (SELECT IFNULL(SUM(amount), 0) FROM material_payments),
+            (SELECT IFNULL(SUM(quantity), 0) FROM daily_log WHERE category = 'Tile'),
+            (SELECT IFNULL(SUM(quantity), 0) FROM sale_lines),
+            (SELECT IFNULL(SUM(amount), 0) FROM sale_lines)
+    """).fetchone()
+    return dict(zip(TOTAL_COLUMNS, row))
+
+
+def verify_totals(conn):
+    """Return ``(column, stored, expected)`` for every total that has drifted."""
+    stored = get_totals(conn)
+    expected = compute_totals(conn)
+    return [
+        (col, stored[col], expected[col])
+        for col in TOTAL_COLUMNS
+        if (stored[col] or 0) != expected[col]
+    ]
+
+
+def fill_totals(cursor):
+    """Replace the running totals with sums over the full history (caller commits)."""
+    totals = compute_totals(cursor.connection)
+    cursor.execute(
+        f"INSERT OR REPLACE INTO ledger_totals (id, {', '.join(TOTAL_COLUMNS)}) "
+        f"VALUES (1, {', '.join('?' for _ in TOTAL_COLUMNS)})",
+        tuple(totals[col] for col in TOTAL_COLUMNS)
+    )
+    return totals
+
+
+def rebuild_totals(conn):
+    from db import write_transaction  # db imports this module
+
+    # Locked before reading, as in rebuild_stock, so no live write is lost
+    with write_transaction(conn) as cursor:
+        return fill_totals(cursor)
+
+
+# ------------------------ DAILY / MONTHLY ROLLUPS ------------------------
+# One row per (period, product_id); product_id 0 carries amounts that are not
+# tied to a SKU (Loading / Pot labour, material purchases).
+
+ROLLUP_COLUMNS = ("produced_qty", "sold_qty", "revenue", "labour_charge", "material_spend")
+
+# (table, period column, length of the ISO date prefix that forms the period)
+ROLLUP_TABLES = (
+    ("rollup_daily", "day", 10),
+    ("rollup_monthly", "month", 7),
+)
+
+
+def apply_rollups(cursor, deltas):
+    """Add ``{(date, product_id): {column: amount}}`` to the rollups on the caller's cursor.
+
+    Buckets that update the same columns share one ``executemany`` per table.
+    """
+    groups = defaultdict(list)
+    for (date, product_id), values in deltas.items():
+        unknown = set(values) - set(ROLLUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown rollup columns: {', '.join(sorted(unknown))}")
+        if values:
+            groups[tuple(sorted(values))].append((date, product_id, values))
+
+    for cols, entries in groups.items():
+        marks = ", ".join("?" for _ in cols)
+        updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in cols)
+        for table, period, width in ROLLUP_TABLES:
+            cursor.executemany(f"""
+                INSERT INTO {table} ({period}, product_id, {', '.join(cols)}) VALUES (?, ?, {marks})
+                ON CONFLICT ({period}, product_id) DO UPDATE SET {updates}
+            """, [
+                (str(date)[:width], product_id or 0, *(values[col] for col in cols))
+                for date, product_id, values in entries
+            ])
+
+
+def rollup_series_query(start, end, monthly=False):
+    """``(sql, tables, params)`` for all-SKU totals per period between ``start`` and ``end``."""
+    table, period, width = ROLLUP_TABLES[1 if monthly else 0]
+    sql = f"""
+        SELECT {period}, {', '.join(f'SUM({col})' for col in ROLLUP_COLUMNS)}
+        FROM {table}
+        WHERE {period} BETWEEN ? AND ?
+        GROUP BY {period}
+        ORDER BY {period}
+    """
+    return sql, [table], (str(start)[:width], str(end)[:width])
+
+
+ROLLUP_SOURCE_QUERY = """
+    SELECT substr(d, 1, 10) AS day, pid,
+           SUM(produced), SUM(sold), SUM(revenue), SUM(labour), SUM(material)
+    FROM (
+        SELECT log_date AS d, IFNULL(product_id, 0) AS pid,
+               CASE WHEN category = 'Tile' THEN quantity ELSE 0 END AS produced,
+               0 AS sold, 0 AS revenue, labour_charge AS labour, 0 AS material
+        FROM daily_log
+        UNION ALL
+        SELECT s.date, l.product_id, 0, l.quantity, l.amount, 0, 0
+        FROM sale_lines l JOIN sales s ON s.id = l.sale_id
+        UNION ALL
+        SELECT date, 0, 0, 0, 0, 0, total_price FROM materials
+    )
+    WHERE d IS NOT NULL
+    GROUP BY day, pid
+"""
+
+
+def compute_rollups(conn):
+    """Recompute ``{(table, period, product_id): values}`` from the base tables."""
+    rollups = {}
+    for day, pid, *values in conn.execute(ROLLUP_SOURCE_QUERY):
+        for table, _, width in ROLLUP_TABLES:
+            key = (table, day[:width], pid)
+            current = rollups.get(key, (0,) * len(ROLLUP_COLUMNS))
+            rollups[key] = tuple(a + (b or 0) for a, b in zip(current, values))
+    return rollups
+
+
+def verify_rollups(conn):
+    """Return ``(key, stored, expected)`` for every rollup bucket that has drifted."""
+    stored = {}
+    for table, period, _ in ROLLUP_TABLES:
+        for key, pid, *values in conn.execute(f"SELECT {period}, product_id, {', '.join(ROLLUP_COLUMNS)} FROM {table}"):
+            stored[(table, key, pid)] = tuple(values)
+    expected = compute_rollups(conn)
+    zero = (0,) * len(ROLLUP_COLUMNS)
+    return [
+        (key, stored.get(key), expected.get(key))
+        for key in sorted(set(stored) | set(expected))
+        if stored.get(key, zero) != expected.get(key, zero)
+    ]
+
+
+def fill_rollups(cursor):
+    """Replace both rollup tables with sums over the full history (caller commits)."""
+    cols = ", ".join(ROLLUP_COLUMNS)
+    sums = ", ".join(f"SUM({col})" for col in ROLLUP_COLUMNS)
+    cursor.execute("DELETE FROM rollup_daily")
+    cursor.execute("DELETE FROM rollup_monthly")
+    cursor.execute(f"INSERT INTO rollup_daily (day, product_id, {cols}) {ROLLUP_SOURCE_QUERY}")
+    cursor.execute(f"""
+        INSERT INTO rollup_monthly (month, product_id, {cols})
+        SELECT substr(day, 1, 7), product_id, {sums}
+        FROM rollup_daily
+        GROUP BY substr(day, 1, 7), product_id
+    """)
+
+
+def rebuild_rollups(conn):
+    """Backfill both rollup tables from the full history."""
+    from db import write_transaction  # db imports this module
+
+    with write_transaction(conn) as cursor:
+        fill_rollups(cursor)
+    return conn.execute("SELECT COUNT(*) FROM rollup_daily").fetchone()[0]
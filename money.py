@@ -0,0 +1,73 @@
+"""Money as whole paise.
+
+Every money column (``labour_charge``, ``amount``, ``price_per_unit``,
+``total_price``, ``price_per_tile``) and every money total or rollup is an
+INTEGER count of paise. Sums in SQLite and pandas are then exact, and the
+running totals can be checked against a recompute with ``==``.
+
+Rupees only exist at the edges: ``to_paise`` for what a user types or a file
+contains, ``Money`` for what is shown.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+PAISE = 100
+
+
+def to_paise(rupees):
+    """Whole paise for a rupee amount (float, str or Decimal), rounded half up."""
+    return int((Decimal(str(rupees)) * PAISE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class Money(int):
+    """An amount in paise that formats as rupees.
+
+    ``f"{Money(123450):,.2f}"`` gives ``1,234.50``; ``str()`` adds the ``₹``.
+    Adding or subtracting Money, or multiplying it by a quantity (rounded to
+    whole paise, so tonnes and cubic feet work too), keeps it Money.
+    """
+
+    def __new__(cls, paise=0):
+        return super().__new__(cls, paise or 0)
+
+    @classmethod
+    def from_rupees(cls, rupees):
+        return cls(to_paise(rupees))
+
+    @property
+    def rupees(self):
+        return Decimal(int(self)) / PAISE
+
+    def __format__(self, spec):
+        return format(self.rupees, spec or ",.2f")
+
+    def __str__(self):
+        return f"₹ {self:,.2f}"
+
+    def __repr__(self):
+        return f"Money({int(self)})"
+
+    def __add__(self, other):
+        return Money(int(self) + int(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Money(int(self) - int(other))
+
+    def __rsub__(self, other):
+        return Money(int(other) - int(self))
+
+    def __mul__(self, quantity):
+        if isinstance(quantity, int):
+            return Money(int(self) * quantity)
+        return Money(int((int(self) * Decimal(str(quantity))).quantize(Decimal(1), rounding=ROUND_HALF_UP)))
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-int(self))
+
+
+def rupees_sql(column):
+    """SQL for a paise ``column`` as rupees, for tables that are only displayed."""
+    return f"{column} / 100.0"
@@ -1,27 +1,24 @@
 import streamlit as st
 import pandas as pd
-from db import get_conn
-# import plotly.express as px
+import plotly.express as px
+from datetime import date, timedelta
+from cache import fetch
+from ledger import ROLLUP_COLUMNS, TOTAL_COLUMNS, TOTALS_QUERY, rollup_series_query
+from money import PAISE, Money, rupees_sql
+from utils import choice_filter, date_range_filter, paginated_table
 
 st.set_page_config(page_title="Tiles Factory Dashboard", layout="wide")
 st.title("🏭 Tiles Factory Dashboard")
 
-# --- DB Connection ---
-conn = get_conn()
-cursor = conn.cursor()
-
-# --- Summary Data ---
-cursor.execute("SELECT SUM(labour_charge) FROM daily_log")
-labour_charges = cursor.fetchone()[0] or 0.0
-
-cursor.execute("SELECT SUM(amount) FROM labour_payments")
-total_paid = cursor.fetchone()[0] or 0.0
-
-cursor.execute("SELECT SUM(total_price) FROM materials")
-material_expense = cursor.fetchone()[0] or 0.0
-
-cursor.execute("SELECT SUM(amount) FROM material_payments")
-material_paid = cursor.fetchone()[0] or 0.0
+# --- Summary Data (one row of running totals, kept current by every write) ---
+totals = dict(zip(TOTAL_COLUMNS, fetch(TOTALS_QUERY, ["ledger_totals"])[0]))
+labour_charges = Money(totals["labour_charges"])
+total_paid = Money(totals["labour_paid"])
+material_expense = Money(totals["material_expense"])
+material_paid = Money(totals["material_paid"])
+total_tiles_produced = totals["tiles_produced"]
+total_tiles_sold = totals["tiles_sold"]
+total_sales_amount = Money(totals["sales_amount"])
 
 labour_balance = labour_charges - total_paid
 material_balance = material_expense - material_paid
@@ -29,20 +26,17 @@ total_expense = labour_charges + material_expense
 total_paid_all = total_paid + material_paid
 
 # --- Tiles Data ---
-cursor.execute("""
-    SELECT tile_type, interlock_subtype, interlock_size, color, SUM(quantity) as total_qty
-    FROM daily_log
-    WHERE category = 'Tile'
-    GROUP BY tile_type, interlock_subtype, interlock_size, color
-""")
-tile_rows = cursor.fetchall()
+tile_rows = fetch("""
+    SELECT p.tile_type, p.interlock_subtype, p.interlock_size, p.color, t.total_qty
+    FROM (
+        SELECT product_id, SUM(quantity) as total_qty
+        FROM daily_log
+        WHERE category = 'Tile'
+        GROUP BY product_id
+    ) t
+    JOIN products p ON p.id = t.product_id
+""", ["daily_log", "products"])
 df_tiles = pd.DataFrame(tile_rows, columns=["Tile Type", "Subtype", "Size", "Color", "Quantity"])
-total_tiles_produced = df_tiles["Quantity"].sum() if not df_tiles.empty else 0
-
-cursor.execute("SELECT SUM(quantity), SUM(amount) FROM sale")
-tiles_sold_data = cursor.fetchone()
-total_tiles_sold = tiles_sold_data[0] or 0
-total_sales_amount = tiles_sold_data[1] or 0.0
 
 # ------------------- KPI CARDS SINGLE LINE WITH ICONS -------------------
 def kpi_card(title, value, color, icon):
@@ -91,15 +85,38 @@ st.markdown(f"""
     </div>
 """, unsafe_allow_html=True)
 
-# ------------------- CHART -------------------
-# if not df_tiles.empty:
-#     st.subheader("📊 Tiles Production vs Sales")
-#     df_chart = pd.DataFrame({
-#         "Metric": ["Produced", "Sold"],
-#         "Quantity": [total_tiles_produced, total_tiles_sold]
-#     })
-#     fig = px.bar(df_chart, x="Metric", y="Quantity", color="Metric", text="Quantity", title="Tiles Production vs Sales")
-#     st.plotly_chart(fig, use_container_width=True)
+# ------------------- TRENDS (from pre-aggregated rollups) -------------------
+st.subheader("📊 Production, Sales & Expenses")
+col1, col2 = st.columns([3, 1])
+with col1:
+    date_range = st.date_input("Date Range", value=(date.today() - timedelta(days=90), date.today()))
+with col2:
+    granularity = st.radio("Group By", ["Day", "Month"], horizontal=True)
+
+if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+    start_date, end_date = date_range
+    sql, tables, params = rollup_series_query(start_date, end_date, monthly=granularity == "Month")
+    df_trend = pd.DataFrame(fetch(sql, tables, params), columns=["Period", *ROLLUP_COLUMNS])
+
+    if df_trend.empty:
+        st.info("No activity in the selected range.")
+    else:
+        money_columns = ["revenue", "labour_charge", "material_spend"]
+        df_trend[money_columns] = df_trend[money_columns] / PAISE
+        df_trend["expenses"] = df_trend["labour_charge"] + df_trend["material_spend"]
+        chart_col1, chart_col2 = st.columns(2)
+        with chart_col1:
+            fig = px.bar(
+                df_trend, x="Period", y=["produced_qty", "sold_qty"], barmode="group",
+                labels={"value": "Tiles", "variable": ""}, title="Tiles Produced vs Sold"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        with chart_col2:
+            fig = px.line(
+                df_trend, x="Period", y=["revenue", "labour_charge", "material_spend", "expenses"],
+                markers=True, labels={"value": "₹", "variable": ""}, title="Revenue vs Expenses"
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
 # ------------------- TILE DETAILS -------------------
 if not df_tiles.empty:
@@ -121,20 +138,37 @@ tab1, tab2, tab3 = st.tabs(["📋 Daily Log", "💵 Labour Payments", "🧾 Mate
 
 with tab1:
     st.subheader("📋 Daily Log")
-    df_log = pd.read_sql("SELECT * FROM daily_log ORDER BY log_date DESC", conn)
-    if "id" in df_log.columns: df_log = df_log.drop(columns=["id"])
-    st.dataframe(df_log.rename(columns=str.upper), use_container_width=True)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        filters = date_range_filter("dash_log", "log_date")
+    with col2:
+        filters += choice_filter("dash_log", "category", "Category", ["Tile", "Loading", "Pot"])
+    with col3:
+        filters += choice_filter("dash_log", "tile_type", "Tile Type", ["1x1", "Interlock"])
+    paginated_table(
+        "dash_log", "daily_log_items",
+        ["category AS CATEGORY", "tile_type AS TILE_TYPE", "interlock_subtype AS INTERLOCK_SUBTYPE",
+         "interlock_size AS INTERLOCK_SIZE", "color AS COLOR", "quantity AS QUANTITY",
+         f"{rupees_sql('labour_charge')} AS LABOUR_CHARGE", "log_date AS LOG_DATE"],
+        order_by=("log_date", "id"), tables=["daily_log", "products"], filters=filters,
+    )
 
 with tab2:
     st.subheader("💵 Labour Payment History")
-    df_payments = pd.read_sql("SELECT * FROM labour_payments ORDER BY date DESC", conn)
-    if "id" in df_payments.columns: df_payments = df_payments.drop(columns=["id"])
-    st.dataframe(df_payments.rename(columns=str.upper), use_container_width=True)
+    filters = date_range_filter("dash_payments", "date")
+    paginated_table(
+        "dash_payments", "labour_payments",
+        ["date AS DATE", f"{rupees_sql('amount')} AS AMOUNT", "purpose AS PURPOSE"],
+        order_by=("date", "id"), tables=["labour_payments"], filters=filters,
+    )
 
 with tab3:
     st.subheader("🧾 Material Expense Records")
-    df_materials = pd.read_sql("SELECT * FROM materials ORDER BY date DESC", conn)
-    if "id" in df_materials.columns: df_materials = df_materials.drop(columns=["id"])
-    st.dataframe(df_materials.rename(columns=str.upper), use_container_width=True)
-
-conn.close()
+    filters = date_range_filter("dash_materials", "date")
+    paginated_table(
+        "dash_materials", "materials",
+        ["date AS DATE", "material_type AS MATERIAL_TYPE", "quantity AS QUANTITY", "unit AS UNIT",
+         f"{rupees_sql('price_per_unit')} AS PRICE_PER_UNIT", f"{rupees_sql('total_price')} AS TOTAL_PRICE",
+         "vendor_id AS VENDOR_ID"],
+        order_by=("date", "id"), tables=["materials"], filters=filters,
+    )
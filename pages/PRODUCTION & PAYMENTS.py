@@ -7,44 +7,25 @@ tab1, tab2 = st.tabs(["Daily Log", "Labour Payments"])
 with tab1:
     # --- Code from sale.py goes here ---
     import streamlit as st
-    import sqlite3
     import pandas as pd
     from datetime import datetime
+    from cache import fetch
+    from db import UnitOfWork
+    from money import Money, rupees_sql
+    from products import COLORS, INTERLOCK_SIZES, INTERLOCK_SUBTYPES, LOG_CATEGORIES, TILE_TYPES, get_product_id
+    from writer import NotSaved, write
 
     # --- Labour Charges ---
-    PER_TILE = 3.50
-    LOADING = 0.50
-    POT = 200.00
-
-    # --- DB Setup ---
-    def get_conn():
-        return sqlite3.connect("data/tiles.db", check_same_thread=False)
-
-    conn = get_conn()
-    cursor = conn.cursor()
-
-    # Create daily_log table if not exists
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS daily_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        category TEXT,
-        tile_type TEXT,
-        interlock_subtype TEXT,
-        interlock_size TEXT,
-        color TEXT,
-        quantity INTEGER,
-        labour_charge REAL,
-        log_date DATE
-    )
-    """)
-    conn.commit()
+    PER_TILE = Money.from_rupees("3.50")
+    LOADING = Money.from_rupees("0.50")
+    POT = Money.from_rupees("200.00")
 
     # --- Streamlit Config ---
     st.set_page_config(page_title="Daily Labour Log", layout="wide")
     st.title("📝 Daily Labour Log")
 
     # --- Main Category ---
-    category = st.selectbox("Select Category", ["Tile", "Loading", "Pot"])
+    category = st.selectbox("Select Category", LOG_CATEGORIES)
 
     # Initialize combos in session
     if "combos" not in st.session_state:
@@ -52,15 +33,15 @@ with tab1:
 
     # --- Tile Options ---
     if category == "Tile":
-        tile_type = st.selectbox("Select Tile Type", ["1x1", "Interlock"])
+        tile_type = st.selectbox("Select Tile Type", TILE_TYPES)
         interlock_subtypes = []
         interlock_sizes = []
         if tile_type == "Interlock":
-            interlock_subtypes = st.multiselect("Select Interlock Subtypes", ["Kuchwa", "Cobble Stone", "L"])
-            interlock_sizes = st.multiselect("Select Interlock Sizes", ["40mm", "60mm", "80mm"])
+            interlock_subtypes = st.multiselect("Select Interlock Subtypes", INTERLOCK_SUBTYPES)
+            interlock_sizes = st.multiselect("Select Interlock Sizes", INTERLOCK_SIZES)
         
         # --- Color Selection with Style ---
-        colors = st.multiselect("Select Colors", ["Red", "Yellow", "Grey", "Black"])
+        colors = st.multiselect("Select Colors", COLORS)
         if colors:
             st.markdown("#### 🎨 Selected Colors:")
             color_map = {
@@ -129,34 +110,49 @@ with tab1:
                 st.text(f"{combo['labour'] * combo['qty']:.2f}")
 
     # --- Save Log ---
+    def save_log(cursor, category, combos, log_date):
+        # Product ids may be new catalog rows, so they are resolved on the writer's cursor
+        uow = UnitOfWork()
+        for combo in combos:
+            total_labour = combo["labour"] * combo["qty"]
+            product_id = None
+            if category == "Tile":
+                product_id = get_product_id(
+                    cursor, combo.get("tile_type"), combo.get("subtype"), combo.get("size"), combo.get("color")
+                )
+            uow.insert(
+                "daily_log", category=category, product_id=product_id,
+                quantity=combo.get("qty"), labour_charge=total_labour, log_date=log_date
+            )
+            if product_id is not None:
+                uow.adjust_stock(product_id, combo.get("qty"))
+                uow.add_totals(labour_charges=total_labour, tiles_produced=combo.get("qty"))
+                uow.add_rollup(log_date, product_id, produced_qty=combo.get("qty"), labour_charge=total_labour)
+            else:
+                uow.add_totals(labour_charges=total_labour)
+                uow.add_rollup(log_date, labour_charge=total_labour)
+        uow.flush(cursor)
+
     if st.session_state.combos:
         if st.button("Save Log"):
-            for combo in st.session_state.combos:
-                total_labour = combo["labour"] * combo["qty"]
-                cursor.execute("""
-                    INSERT INTO daily_log (category, tile_type, interlock_subtype, interlock_size, color, quantity, labour_charge, log_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    category,
-                    combo.get("tile_type"),
-                    combo.get("subtype"),
-                    combo.get("size"),
-                    combo.get("color"),
-                    combo.get("qty"),
-                    total_labour,
-                    datetime.now().date()
-                ))
-            conn.commit()
-            st.success("✅ Log saved successfully!")
-            st.session_state.combos = []
+            try:
+                write(
+                    save_log, category, st.session_state.combos, str(datetime.now().date()),
+                    tables=["daily_log", "products", "tile_stock", "ledger_totals", "rollup_daily", "rollup_monthly"]
+                )
+            except NotSaved as exc:
+                st.error(f"❌ {exc}")
+            else:
+                st.success("✅ Log saved successfully!")
+                st.session_state.combos = []
 
     # --- Show Today's Logs ---
     st.subheader("📊 Today's Logs")
     today = datetime.now().date()
-    rows = cursor.execute("""
-        SELECT category, tile_type, interlock_subtype, interlock_size, color, quantity, labour_charge, log_date
-        FROM daily_log WHERE log_date=?
-    """, (today,)).fetchall()
+    rows = fetch(f"""
+        SELECT category, tile_type, interlock_subtype, interlock_size, color, quantity, {rupees_sql('labour_charge')}, log_date
+        FROM daily_log_items WHERE log_date=?
+    """, ["daily_log", "products"], (str(today),))
 
     df = pd.DataFrame(rows, columns=["Category", "Tile Type", "Subtype", "Size", "Color", "Quantity", "Labour Charge", "Date"])
     st.data_editor(df, hide_index=True)
@@ -167,22 +163,20 @@ with tab2:
     # --- Code from invoice.py goes here ---
     import streamlit as st
     import pandas as pd
-    from db import get_conn
+    from cache import fetch
+    from db import UnitOfWork
+    from ledger import TOTAL_COLUMNS, TOTALS_QUERY
+    from money import Money, rupees_sql
+    from utils import date_range_filter, paginated_table
+    from writer import NotSaved, write
 
     st.set_page_config(page_title="Labour Payments Dashboard", layout="wide")
     st.title("🧾 Labour Payments Dashboard")
 
-    # --- DB Connection ---
-    conn = get_conn()
-    cursor = conn.cursor()
-
-    # --- Calculate totals from daily_log ---
-    cursor.execute("SELECT SUM(labour_charge) FROM daily_log")
-    total_charges = cursor.fetchone()[0] or 0.0   # includes loading also
-
-    # --- Calculate total paid ---
-    cursor.execute("SELECT SUM(amount) FROM labour_payments")
-    total_paid = cursor.fetchone()[0] or 0.0      # only real cash payments
+    # --- Running totals (kept current by every write) ---
+    totals = dict(zip(TOTAL_COLUMNS, fetch(TOTALS_QUERY, ["ledger_totals"])[0]))
+    total_charges = Money(totals["labour_charges"])   # includes loading also
+    total_paid = Money(totals["labour_paid"])         # only real cash payments
 
     # --- Balance ---
     balance = total_charges - total_paid
@@ -202,19 +196,24 @@ with tab2:
         purpose = st.text_input("Purpose (optional)")
         
         if st.button("Add Payment"):
-            cursor.execute(
-                "INSERT INTO labour_payments(date, amount, purpose) VALUES(?,?,?)",
-                (str(payment_date), amount, purpose)
-            )
-            conn.commit()
-            st.success(f"✅ Payment of ₹ {amount:,.2f} added!")
+            amount = Money.from_rupees(amount)
+            uow = UnitOfWork()
+            uow.insert("labour_payments", date=str(payment_date), amount=amount, purpose=purpose)
+            uow.add_totals(labour_paid=amount)
+            try:
+                write(uow.flush, tables=uow.tables)
+            except NotSaved as exc:
+                st.error(f"❌ {exc}")
+            else:
+                st.success(f"✅ Payment of ₹ {amount:,.2f} added!")
 
     st.markdown("---")
 
     # --- Display all payments ---
     st.subheader("📋 Payment History")
-    df_payments = pd.read_sql("SELECT * FROM labour_payments ORDER BY date DESC", conn)
-    st.dataframe(df_payments, use_container_width=True)
-
-    conn.close()
+    filters = date_range_filter("labour_payments", "date")
+    paginated_table(
+        "labour_payments", "labour_payments", ["id", "date", f"{rupees_sql('amount')} AS amount", "purpose"],
+        order_by=("date", "id"), tables=["labour_payments"], filters=filters,
+    )
 
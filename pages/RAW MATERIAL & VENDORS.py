@@ -8,74 +8,45 @@ with tab1:
     # --- Code from sale.py goes here ---
     import streamlit as st
     import pandas as pd
-    from db import get_conn
+    from cache import fetch
+    from db import UnitOfWork
+    from money import PAISE, Money
+    from vendors import VENDOR_ITEMS_QUERY, VENDOR_LEDGER_QUERY, VENDOR_LEDGER_TABLES, VENDOR_PAYMENTS_QUERY
+    from writer import NotSaved, write
 
-    # --- Helper functions ---
+    # --- Helper functions (reads are cached until the table is written) ---
     def get_all_vendors():
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name FROM vendors ORDER BY name")
-        vendors = cursor.fetchall()
-        conn.close()
-        return vendors
+        return fetch("SELECT id, name FROM vendors ORDER BY name", ["vendors"])
 
     def get_vendor_materials(vendor_id):
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute("SELECT material_name FROM vendor_materials WHERE vendor_id=?", (vendor_id,))
-        mats = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return mats
-
-    def add_material(date, material_type, unit, quantity, price_per_unit, vendor_id):
-        total_price = quantity * price_per_unit
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO materials (date, material_type, quantity, unit, price_per_unit, total_price, vendor_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (date, material_type, quantity, unit, price_per_unit, total_price, vendor_id))
-        conn.commit()
-        conn.close()
-
-    def get_materials():
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.date, m.material_type, m.quantity, m.unit, m.price_per_unit, m.total_price, v.id, v.name
-            FROM materials m
-            JOIN vendors v ON m.vendor_id = v.id
-            ORDER BY v.name, m.date DESC
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        rows = fetch("SELECT material_name FROM vendor_materials WHERE vendor_id=?", ["vendor_materials"], (vendor_id,))
+        return [row[0] for row in rows]
+
+    # --- Writes are collected in a unit of work and committed on the writer thread ---
+    def add_material(uow, date, material_type, unit, quantity, price_per_unit, vendor_id):
+        total_price = Money(price_per_unit) * quantity
+        uow.insert(
+            "materials", date=date, material_type=material_type, quantity=quantity, unit=unit,
+            price_per_unit=price_per_unit, total_price=total_price, vendor_id=vendor_id
+        )
+        uow.add_totals(material_expense=total_price)
+        uow.add_rollup(date, material_spend=total_price)
+
+    def get_vendor_ledger():
+        # Procured / paid / balance / last activity for every vendor in one query
+        return fetch(VENDOR_LEDGER_QUERY, VENDOR_LEDGER_TABLES)
+
+    def get_vendor_items(vendor_id):
+        return fetch(VENDOR_ITEMS_QUERY, ["materials"], (vendor_id,))
 
     def add_payment(vendor_id, date, amount):
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO material_payments (vendor_id, date, amount)
-            VALUES (?, ?, ?)
-        ''', (vendor_id, date, amount))
-        conn.commit()
-        conn.close()
-
-    def get_vendor_paid_total(vendor_id):
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute('SELECT IFNULL(SUM(amount),0) FROM material_payments WHERE vendor_id=?', (vendor_id,))
-        paid = cursor.fetchone()[0]
-        conn.close()
-        return paid
+        uow = UnitOfWork()
+        uow.insert("material_payments", vendor_id=vendor_id, date=date, amount=amount)
+        uow.add_totals(material_paid=amount)
+        write(uow.flush, tables=uow.tables)
 
     def get_vendor_payments(vendor_id):
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute('SELECT date, amount FROM material_payments WHERE vendor_id=? ORDER BY date DESC', (vendor_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        return fetch(VENDOR_PAYMENTS_QUERY, ["material_payments"], (vendor_id,))
 
 
     # --- Initialize session state flags ---
@@ -110,62 +81,72 @@ with tab1:
                         st.markdown(f"**{mat}**")
                         cols = st.columns(3)
                         qty = cols[0].number_input(f"Quantity ({mat})", min_value=0, step=1, key=f"qty_{mat}")
-                        price = cols[1].number_input(f"Price per unit ({mat})", min_value=0.0, step=0.1, key=f"ppu_{mat}")
+                        price = Money.from_rupees(
+                            cols[1].number_input(f"Price per unit ({mat})", min_value=0.0, step=0.1, key=f"ppu_{mat}")
+                        )
                         unit = cols[2].text_input(f"Unit ({mat})", value="bags", key=f"unit_{mat}")
 
                         if qty > 0 and price > 0:
-                            total = qty * price
+                            total = price * qty
                             st.write(f"💰 Total for {mat}: ₹ {total:,.2f}")
                             entries.append((mat, unit, qty, price, total))
 
                     submitted = st.form_submit_button("Add Procurement")
                     if submitted and entries:
+                        # Every material of the procurement is one commit
+                        uow = UnitOfWork()
                         for (mat, unit, qty, price, total) in entries:
-                            add_material(str(date), mat, unit, qty, price, vendor_id)
-                        st.success("✅ Procurement records added successfully!")
-                        st.rerun()
+                            add_material(uow, str(date), mat, unit, qty, price, vendor_id)
+                        try:
+                            write(uow.flush, tables=uow.tables)
+                        except NotSaved as exc:
+                            st.error(f"❌ {exc}")
+                        else:
+                            st.success("✅ Procurement records added successfully!")
+                            st.rerun()
 
     # --- Display Materials & Payments ---
-    materials = get_materials()
-    if not materials:
+    ledger = get_vendor_ledger()
+    if not ledger:
         st.info("No materials added yet.")
     else:
-        df = pd.DataFrame(materials, columns=["Date","Material","Quantity","Unit","Price/Unit","Total Price","Vendor_ID","Vendor"])
-        
-        vendor_totals = df.groupby("Vendor").agg({"Total Price":"sum"}).reset_index()
-        
-        for _, row in vendor_totals.iterrows():
-            vendor_name = row["Vendor"]
-            total_price = row["Total Price"]
-            cols = st.columns([2, 1, 1])
+        for vendor_id, vendor_name, total_price, vendor_paid, vendor_balance, last_activity in ledger:
+            total_price, vendor_paid, vendor_balance = Money(total_price), Money(vendor_paid), Money(vendor_balance)
+            cols = st.columns([2, 1, 1, 1, 1])
             cols[0].write(vendor_name)
             cols[1].write(f"₹ {total_price:,.2f}")
+            cols[2].write(f"🏷️ ₹ {vendor_balance:,.2f}")
+            cols[3].write(last_activity)
             
             if vendor_name not in st.session_state.view_flags:
                 st.session_state.view_flags[vendor_name] = False
-            if cols[2].button("View Details", key=f"view_{vendor_name}"):
+            if cols[4].button("View Details", key=f"view_{vendor_name}"):
                 st.session_state.view_flags[vendor_name] = not st.session_state.view_flags[vendor_name]
 
             if st.session_state.view_flags[vendor_name]:
-                vendor_items = df[df["Vendor"] == vendor_name][["Date","Material","Quantity","Unit","Price/Unit","Total Price"]]
+                # Detail rows are only read for the vendor that is expanded
+                vendor_items = pd.DataFrame(
+                    get_vendor_items(vendor_id),
+                    columns=["Date","Material","Quantity","Unit","Price/Unit","Total Price"]
+                )
+                vendor_items[["Price/Unit", "Total Price"]] = vendor_items[["Price/Unit", "Total Price"]] / PAISE
                 st.text(f"📋 Details for {vendor_name}")
                 st.dataframe(vendor_items, use_container_width=True)
                 
-                vendor_id = df[df["Vendor"] == vendor_name]["Vendor_ID"].iloc[0]
-                vendor_paid = get_vendor_paid_total(vendor_id)
-                vendor_balance = total_price - vendor_paid
                 st.write(f"💵 Paid: ₹ {vendor_paid:,.2f} | 🏷️ Balance: ₹ {vendor_balance:,.2f}")
                 
                 payments = get_vendor_payments(vendor_id)
                 if payments:
                     st.write("📜 Payment History:")
-                    st.table([{"Date": p[0], "Amount": f"₹ {p[1]:,.2f}"} for p in payments])
+                    st.table([{"Date": p[0], "Amount": str(Money(p[1]))} for p in payments])
                 else:
                     st.info("No payments recorded yet.")
                 
                 with st.form(f"payment_form_{vendor_id}"):
                     pay_date = st.date_input("Payment Date", key=f"pdate_{vendor_id}")
-                    pay_amount = st.number_input("Payment Amount", min_value=0.0, step=0.1, key=f"pamt_{vendor_id}")
+                    pay_amount = Money.from_rupees(
+                        st.number_input("Payment Amount", min_value=0.0, step=0.1, key=f"pamt_{vendor_id}")
+                    )
                     pay_submit = st.form_submit_button("Add Payment")
                     if pay_submit:
                         if pay_amount <= 0:
@@ -173,34 +154,45 @@ with tab1:
                         elif pay_amount > vendor_balance:
                             st.error("⚠️ Payment exceeds remaining balance!")
                         else:
-                            add_payment(vendor_id, str(pay_date), pay_amount)
-                            st.success("✅ Payment added successfully!")
-                            st.rerun()
+                            try:
+                                add_payment(vendor_id, str(pay_date), pay_amount)
+                            except NotSaved as exc:
+                                st.error(f"❌ {exc}")
+                            else:
+                                st.success("✅ Payment added successfully!")
+                                st.rerun()
 
 # ---------------- TAB 2: Invoice Generator ----------------
 with tab2:
     # --- Code from invoice.py goes here ---
+    import sqlite3
     import streamlit as st
     import pandas as pd
-    from db import get_conn
+    from cache import read_sql
+    from db import UnitOfWork
+    from writer import NotSaved, write
 
     st.set_page_config(page_title="Vendors", layout="wide")
     st.title("🏪 Vendor Management")
 
-    # --- DB Connection ---
-    conn = get_conn()
-    cursor = conn.cursor()
-
-    # Ensure vendor_materials table exists
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS vendor_materials (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        vendor_id INTEGER,
-        material_name TEXT,
-        FOREIGN KEY(vendor_id) REFERENCES vendors(id)
-    )
-    ''')
-    conn.commit()
+    # --- Write commands (run on the writer thread) ---
+    def add_vendor(cursor, name, phone, details, materials):
+        cursor.execute(
+            "INSERT INTO vendors(name, phone, details) VALUES (?, ?, ?)",
+            (name, phone, details)
+        )
+        vendor_id = cursor.lastrowid  # new vendor id
+
+        # Insert selected materials
+        uow = UnitOfWork()
+        for mat in materials:
+            uow.insert("vendor_materials", vendor_id=vendor_id, material_name=mat)
+        uow.flush(cursor)
+        return vendor_id
+
+    def delete_vendor(cursor, vendor_id):
+        cursor.execute("DELETE FROM vendor_materials WHERE vendor_id=?", (vendor_id,))
+        cursor.execute("DELETE FROM vendors WHERE id=?", (vendor_id,))
 
     # --- Add New Vendor ---
     with st.expander("Add New Vendor"):
@@ -216,29 +208,20 @@ with tab2:
             if name.strip() == "":
                 st.error("Vendor name cannot be empty")
             else:
-                cursor.execute(
-                    "INSERT INTO vendors(name, phone, details) VALUES (?, ?, ?)",
-                    (name, phone, details)
-                )
-                vendor_id = cursor.lastrowid  # new vendor id
-
-                # Insert selected materials
-                for mat in selected_materials:
-                    cursor.execute(
-                        "INSERT INTO vendor_materials(vendor_id, material_name) VALUES (?, ?)",
-                        (vendor_id, mat)
-                    )
-
-                conn.commit()
-                st.success(f"Vendor '{name}' added with materials: {', '.join(selected_materials)}")
+                try:
+                    write(add_vendor, name, phone, details, selected_materials, tables=["vendors", "vendor_materials"])
+                except NotSaved as exc:
+                    st.error(f"❌ {exc}")
+                else:
+                    st.success(f"Vendor '{name}' added with materials: {', '.join(selected_materials)}")
 
     # --- Show Vendors ---
     st.subheader("📋 Vendor List")
-    vendors_df = pd.read_sql("SELECT id, name, phone, details FROM vendors", conn)
+    vendors_df = read_sql("SELECT id, name, phone, details FROM vendors", ["vendors"])
 
     if not vendors_df.empty:
         # Fetch vendor-materials mapping
-        materials_df = pd.read_sql("SELECT vendor_id, material_name FROM vendor_materials", conn)
+        materials_df = read_sql("SELECT vendor_id, material_name FROM vendor_materials", ["vendor_materials"])
         material_map = materials_df.groupby("vendor_id")["material_name"].apply(list).to_dict()
 
         vendors_df["Materials"] = vendors_df["id"].map(material_map).fillna("").apply(
@@ -254,18 +237,20 @@ with tab2:
 
     # --- Delete Vendor ---
     with st.expander("Delete Vendor"):
-        vendors = pd.read_sql("SELECT id, name FROM vendors", conn)
+        vendors = read_sql("SELECT id, name FROM vendors", ["vendors"])
         if not vendors.empty:
             vendor_choice = st.selectbox("Select Vendor to Delete", vendors["name"])
             if st.button("Delete Vendor"):
-                vendor_id = vendors[vendors["name"] == vendor_choice]["id"].values[0]
-                cursor.execute("DELETE FROM vendor_materials WHERE vendor_id=?", (vendor_id,))
-                cursor.execute("DELETE FROM vendors WHERE id=?", (vendor_id,))
-                conn.commit()
-                st.success(f"Vendor '{vendor_choice}' deleted!")
+                vendor_id = int(vendors[vendors["name"] == vendor_choice]["id"].values[0])
+                try:
+                    write(delete_vendor, vendor_id, tables=["vendors", "vendor_materials"])
+                    st.success(f"Vendor '{vendor_choice}' deleted!")
+                except sqlite3.IntegrityError:
+                    # Foreign keys keep procurement and payment history attached to a vendor;
+                    # the writer has already rolled this command back
+                    st.error(f"Vendor '{vendor_choice}' has procurement or payment records and cannot be deleted.")
+                except NotSaved as exc:
+                    st.error(f"❌ {exc}")
         else:
             st.warning("No vendors available to delete.")
 
-    # --- Close Connection ---
-    conn.close()
-
@@ -0,0 +1,61 @@
+"""Tile product catalog.
+
+Every SKU (tile type, interlock subtype, interlock size, color) gets one row in
+``products`` and a compact integer id that ``daily_log``, ``sale_lines`` and
+``tile_stock`` reference instead of repeating the four descriptors.
+"""
+
+PRODUCT_KEY = ("tile_type", "interlock_subtype", "interlock_size", "color")
+
+# What the Daily Log offers; 1x1 tiles have "-" for subtype and size
+LOG_CATEGORIES = ("Tile", "Loading", "Pot")
+TILE_TYPES = ("1x1", "Interlock")
+INTERLOCK_SUBTYPES = ("Kuchwa", "Cobble Stone", "L")
+INTERLOCK_SIZES = ("40mm", "60mm", "80mm")
+COLORS = ("Red", "Yellow", "Grey", "Black")
+
+
+def product_name(tile_type, interlock_subtype, interlock_size, color):
+    # Same descriptor the sales page has always shown, e.g. "Interlock Cobble Stone 60mm Red"
+    return f"{tile_type} {interlock_subtype} {interlock_size} {color}".replace(" - -", "")
+
+
+def parse_product_name(name):
+    # Inverse of product_name, only needed to migrate legacy sale.tile_type strings
+    parts = name.split()
+    if parts[0] == "1x1":
+        return ("1x1", "-", "-", parts[-1])
+    elif parts[0] == "Interlock":
+        return ("Interlock", " ".join(parts[1:-2]), parts[-2], parts[-1])
+    else:
+        return (name, "-", "-", "-")
+
+
+def is_valid_product(tile_type, interlock_subtype, interlock_size, color):
+    if tile_type == "Interlock":
+        return interlock_subtype in INTERLOCK_SUBTYPES and interlock_size in INTERLOCK_SIZES and color in COLORS
+    return tile_type in TILE_TYPES and (interlock_subtype, interlock_size) == ("-", "-") and color in COLORS
+
+
+def get_product_id(cursor, tile_type, interlock_subtype, interlock_size, color):
+    """Return the SKU id for a combination, adding it to the catalog if new."""
+    key = (tile_type, interlock_subtype, interlock_size, color)
+    row = cursor.execute("""
+        SELECT id FROM products
+        WHERE tile_type=? AND interlock_subtype=? AND interlock_size=? AND color=?
+    """, key).fetchone()
+    if row:
+        return row[0]
+    cursor.execute("""
+        INSERT INTO products (tile_type, interlock_subtype, interlock_size, color, name)
+        VALUES (?, ?, ?, ?, ?)
+    """, (*key, product_name(*key)))
+    return cursor.lastrowid
+
+
+def get_products(conn):
+    return conn.execute("""
+        SELECT id, tile_type, interlock_subtype, interlock_size, color, name
+        FROM products
+        ORDER BY tile_type, interlock_subtype, interlock_size, color
+    """).fetchall()
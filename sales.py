@@ -0,0 +1,53 @@
+"""Recording a sale.
+
+The stock shown when an item was added to the cart may be stale by the time
+the sale is confirmed: other cart lines, other counters and other sessions
+can sell the same units. ``write_sale`` re-checks every line and takes the
+stock in the same write transaction that records the sale, so two counters
+can never both sell the last tiles.
+"""
+from collections import Counter
+
+from db import UnitOfWork
+from stock import reserve_stock
+
+SALE_TABLES = ("sales", "sale_lines", "tile_stock", "ledger_totals", "rollup_daily", "rollup_monthly")
+
+
+def write_sale(cursor, customer_name, customer_phone, payment_mode, sale_date, cart):
+    """Write a sale and take its stock, or write nothing, on the caller's write transaction.
+
+    ``cart`` is a list of dicts with ``product_id``, ``qty``, ``price`` and
+    ``amount`` (both in paise). Returns ``(sale_id, [])`` on success, or ``(None, conflicts)``
+    where each conflict is ``(cart index, product_id, requested, available)``;
+    ``requested`` counts every cart line for that SKU.
+    """
+    requested = Counter()
+    for item in cart:
+        requested[item["product_id"]] += item["qty"]
+
+    short = reserve_stock(cursor, requested)
+    if short:
+        return None, [
+            (i, item["product_id"], requested[item["product_id"]], short[item["product_id"]])
+            for i, item in enumerate(cart)
+            if item["product_id"] in short
+        ]
+
+    cursor.execute("""
+        INSERT INTO sales (customer_name, customer_phone_number, payment_mode, date)
+        VALUES (?, ?, ?, ?)
+    """, (customer_name, customer_phone, payment_mode, sale_date))
+    sale_id = cursor.lastrowid  # sequential invoice number
+
+    # Stock was already taken by reserve_stock
+    uow = UnitOfWork()
+    for item in cart:
+        uow.insert(
+            "sale_lines", sale_id=sale_id, product_id=item["product_id"],
+            quantity=item["qty"], price_per_tile=item["price"], amount=item["amount"]
+        )
+        uow.add_totals(tiles_sold=item["qty"], sales_amount=item["amount"])
+        uow.add_rollup(sale_date, item["product_id"], sold_qty=item["qty"], revenue=item["amount"])
+    uow.flush(cursor)
+    return sale_id, []
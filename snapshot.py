@@ -0,0 +1,175 @@
+"""Columnar snapshot of the history tables for analytics and notebooks.
+
+    python snapshot.py           # append the rows added since the last run
+    python snapshot.py --full    # rewrite every dataset from scratch
+
+Each dataset is a directory of uncompressed Arrow IPC files partitioned by
+the month of its date column (``<dataset>/year=2024/month=5/part-*.arrow``).
+History rows are only ever inserted, so a run reads just the rows whose id
+is above the high-water mark in ``manifest.json`` and appends new files; the
+mark advances after every batch, and a batch that is re-run after a crash
+overwrites its own files.
+
+Money columns are whole paise (int64), as in the database. ``SCHEMA_VERSION``
+is kept in the manifest; when a run finds an older one it rewrites every
+dataset instead of appending rows of a different type.
+
+``load`` opens a dataset memory-mapped: only the requested columns of the
+requested partitions are paged in, straight into Arrow buffers, with no
+per-value Python objects and no parsing:
+
+    from snapshot import load
+    sales = load("sale_items", ["date", "tile_type", "amount"], years=[2023, 2024]).to_pandas()
+
+Needs pyarrow, which only this module uses.
+"""
+import argparse
+import json
+import shutil
+from collections import defaultdict
+from pathlib import Path
+
+from db import DB_PATH, get_conn
+
+SNAPSHOT_DIR = DB_PATH.parent / "snapshot"
+MANIFEST = "manifest.json"
+BATCH_SIZE = 50000
+SCHEMA_VERSION = 2  # bump when a dataset's columns or types change
+
+# name -> (source, date column, [(column, arrow type)]); every source has an increasing id
+DATASETS = {
+    "daily_log": ("daily_log_items", "log_date", [
+        ("id", "int64"), ("category", "string"), ("product_id", "int64"),
+        ("tile_type", "string"), ("interlock_subtype", "string"), ("interlock_size", "string"),
+        ("color", "string"), ("quantity", "int64"), ("labour_charge", "int64"), ("log_date", "string"),
+    ]),
+    "sale_items": ("sale_items", "date", [
+        ("id", "int64"), ("sale_id", "int64"), ("customer_name", "string"), ("customer_phone_number", "string"),
+        ("product_id", "int64"), ("item_name", "string"), ("tile_type", "string"),
+        ("interlock_subtype", "string"), ("interlock_size", "string"), ("color", "string"),
+        ("quantity", "int64"), ("price_per_tile", "int64"), ("amount", "int64"),
+        ("payment_mode", "string"), ("date", "string"),
+    ]),
+    "materials": ("materials", "date", [
+        ("id", "int64"), ("date", "string"), ("material_type", "string"), ("quantity", "float64"),
+        ("unit", "string"), ("price_per_unit", "int64"), ("total_price", "int64"), ("vendor_id", "int64"),
+    ]),
+    "material_payments": ("material_payments", "date", [
+        ("id", "int64"), ("vendor_id", "int64"), ("date", "string"), ("amount", "int64"),
+    ]),
+    "labour_payments": ("labour_payments", "date", [
+        ("id", "int64"), ("date", "string"), ("amount", "int64"), ("purpose", "string"),
+    ]),
+}
+
+
+def _arrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("The analytics snapshot needs pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def _schema(pa, name):
+    return pa.schema([(col, getattr(pa, kind)()) for col, kind in DATASETS[name][2]])
+
+
+def _partition(value):
+    # Dates are stored as 'YYYY-MM-DD[ HH:MM:SS]'; rows without one go to year=0/month=0
+    text = str(value or "")
+    if len(text) >= 7 and text[:4].isdigit() and text[5:7].isdigit():
+        return int(text[:4]), int(text[5:7])
+    return 0, 0
+
+
+# ------------------------ EXPORT ------------------------
+def _read_manifest(out):
+    path = out / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _write_manifest(out, manifest):
+    tmp = out / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    tmp.replace(out / MANIFEST)
+
+
+def _write_batch(pa, out, name, rows, first_id):
+    source, date_column, columns = DATASETS[name]
+    schema = _schema(pa, name)
+    date_index = [col for col, _ in columns].index(date_column)
+
+    partitions = defaultdict(list)
+    for row in rows:
+        partitions[_partition(row[date_index])].append(row)
+
+    for (year, month), part in partitions.items():
+        directory = out / name / f"year={year}" / f"month={month}"
+        directory.mkdir(parents=True, exist_ok=True)
+        table = pa.table(
+            [pa.array([row[i] for row in part], type=field.type) for i, field in enumerate(schema)],
+            schema=schema,
+        )
+        with pa.OSFile(str(directory / f"part-{first_id:012d}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+
+
+def export_snapshot(conn, out=SNAPSHOT_DIR, full=False):
+    """Append new rows of every dataset under ``out``; returns ``{dataset: rows written}``."""
+    pa = _arrow()
+    out.mkdir(parents=True, exist_ok=True)
+    if _read_manifest(out).get("schema_version") != SCHEMA_VERSION:
+        full = True
+    if full:
+        for name in DATASETS:
+            shutil.rmtree(out / name, ignore_errors=True)
+        (out / MANIFEST).unlink(missing_ok=True)
+
+    manifest = _read_manifest(out)
+    manifest["schema_version"] = SCHEMA_VERSION
+    written = {}
+    for name, (source, _, columns) in DATASETS.items():
+        mark = manifest.get(name, 0)
+        cursor = conn.execute(
+            f"SELECT {', '.join(col for col, _ in columns)} FROM {source} WHERE id > ? ORDER BY id", (mark,)
+        )
+        written[name] = 0
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            _write_batch(pa, out, name, rows, rows[0][0])
+            manifest[name] = rows[-1][0]
+            _write_manifest(out, manifest)
+            written[name] += len(rows)
+    return written
+
+
+# ------------------------ READ ------------------------
+def load(name, columns=None, years=None, out=SNAPSHOT_DIR):
+    """A memory-mapped ``pyarrow.Table`` of ``columns`` (all by default), optionally only ``years``."""
+    pa = _arrow()
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    dataset = ds.dataset(
+        str(out / name),
+        schema=_schema(pa, name).append(pa.field("year", pa.int16())).append(pa.field("month", pa.int8())),
+        format="ipc",
+        partitioning=ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    year_filter = ds.field("year").isin(list(years)) if years else None
+    return dataset.to_table(columns=columns, filter=year_filter)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the Arrow analytics snapshot.")
+    parser.add_argument("--out", default=str(SNAPSHOT_DIR))
+    parser.add_argument("--full", action="store_true", help="rewrite every dataset from scratch")
+    args = parser.parse_args()
+
+    for name, count in export_snapshot(get_conn(), Path(args.out), args.full).items():
+        print(f"✅ {name}: {count:,} new rows")
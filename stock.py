@@ -0,0 +1,110 @@
+"""Live tile stock kept in the ``tile_stock`` table.
+
+Production logs add to it and sales take from it inside the same transaction
+as the row that caused the change, so reading stock is one row per SKU
+instead of replaying the whole ``daily_log`` and ``sale_lines`` history.
+"""
+
+
+def adjust_stocks(cursor, deltas):
+    """Add ``{product_id: delta}`` to stock with one ``executemany`` on the caller's cursor."""
+    cursor.executemany("""
+        INSERT INTO tile_stock (product_id, available_qty) VALUES (?, ?)
+        ON CONFLICT (product_id) DO UPDATE SET available_qty = available_qty + excluded.available_qty
+    """, deltas.items())
+
+
+def reserve_stock(cursor, quantities):
+    """Take ``{product_id: qty}`` from stock if every SKU has enough.
+
+    Returns ``{product_id: available}`` for the SKUs that fall short, in which
+    case nothing is taken. Run it inside a write transaction (``BEGIN
+    IMMEDIATE``) so no other writer can sell the same units in between.
+    """
+    marks = ", ".join("?" for _ in quantities)
+    available = dict(cursor.execute(
+        f"SELECT product_id, available_qty FROM tile_stock WHERE product_id IN ({marks})",
+        tuple(quantities)
+    ).fetchall())
+    short = {
+        pid: available.get(pid, 0)
+        for pid, qty in quantities.items()
+        if qty > available.get(pid, 0)
+    }
+    if not short:
+        cursor.executemany(
+            "UPDATE tile_stock SET available_qty = available_qty - ? WHERE product_id = ?",
+            [(qty, pid) for pid, qty in quantities.items()]
+        )
+    return short
+
+
+STOCK_QUERY = """
+    SELECT p.id, p.tile_type, p.interlock_subtype, p.interlock_size, p.color, s.available_qty
+    FROM tile_stock s
+    JOIN products p ON p.id = s.product_id
+    ORDER BY p.tile_type, p.interlock_subtype, p.interlock_size, p.color
+"""
+STOCK_TABLES = ("tile_stock", "products")
+
+
+def get_stock(conn):
+    return conn.execute(STOCK_QUERY).fetchall()
+
+
+def build_stock_index(rows):
+    """Nest ``STOCK_QUERY`` rows as type -> subtype -> size -> color -> (product id, qty).
+
+    Each level keeps the query's sort order, so its keys are the options of
+    the matching selector.
+    """
+    index = {}
+    for product_id, tile_type, subtype, size, color, qty in rows:
+        index.setdefault(tile_type, {}).setdefault(subtype, {}).setdefault(size, {})[color] = (product_id, qty)
+    return index
+
+
+# ------------------------ REBUILD / REPAIR ------------------------
+def compute_stock(conn):
+    """Recompute stock per product id from the full production and sales history."""
+    return dict(conn.execute("""
+        SELECT product_id, SUM(qty) FROM (
+            SELECT product_id, quantity AS qty FROM daily_log WHERE category='Tile'
+            UNION ALL
+            SELECT product_id, -quantity FROM sale_lines
+        )
+        WHERE product_id IS NOT NULL
+        GROUP BY product_id
+    """).fetchall())
+
+
+def verify_stock(conn):
+    """Return ``(product name, stored, expected)`` for every SKU that has drifted."""
+    stored = dict(conn.execute("SELECT product_id, available_qty FROM tile_stock").fetchall())
+    expected = compute_stock(conn)
+    names = dict(conn.execute("SELECT id, name FROM products").fetchall())
+    return [
+        (names.get(pid, str(pid)), stored.get(pid), expected.get(pid))
+        for pid in sorted(set(stored) | set(expected))
+        if stored.get(pid) != expected.get(pid)
+    ]
+
+
+def fill_stock(cursor):
+    """Replace tile_stock with stock computed from the full history (caller commits)."""
+    stock = compute_stock(cursor.connection)
+    cursor.execute("DELETE FROM tile_stock")
+    cursor.executemany(
+        "INSERT INTO tile_stock (product_id, available_qty) VALUES (?, ?)",
+        stock.items()
+    )
+    return len(stock)
+
+
+def rebuild_stock(conn):
+    from db import write_transaction  # db imports this module
+
+    # The write lock is taken before the history is read, so a sale committed
+    # by the running app cannot land between the read and the replace.
+    with write_transaction(conn) as cursor:
+        return fill_stock(cursor)
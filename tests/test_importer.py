@@ -0,0 +1,26 @@
+from db import migrate, open_conn
+from importer import import_file
+
+
+def test_sales_invoice_continued_across_chunks(tmp_path):
+    conn = open_conn(tmp_path / "tiles.db")
+    migrate(conn)
+    path = tmp_path / "sales.csv"
+    path.write_text(
+        "invoice,date,customer_name,tile_type,color,quantity,price_per_tile\n"
+        "A,2024-01-05,Ravi,1x1,Red,10,12.50\n"
+        "B,2024-01-05,Asha,1x1,Grey,5,12.50\n"
+        "A,2024-01-05,Ravi,1x1,Grey,2,12.50\n"  # starts the second chunk with an earlier invoice
+        "C,2024-01-06,Imran,1x1,Red,1,12.50\n"
+    )
+
+    imported, bad = import_file(conn, "sales", path, chunk_size=2)
+
+    assert (imported, bad) == (4, 0)
+    lines = conn.execute("""
+        SELECT s.customer_name, COUNT(*), SUM(l.amount)
+        FROM sales s JOIN sale_lines l ON l.sale_id = s.id
+        GROUP BY s.id ORDER BY s.id
+    """).fetchall()
+    assert lines == [("Ravi", 2, 15000), ("Asha", 1, 6250), ("Imran", 1, 1250)]
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
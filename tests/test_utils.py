@@ -0,0 +1,48 @@
+import sqlite3
+
+import pandas as pd
+
+from utils import page_query, prefix_condition, row_cursor
+
+
+def _pages(conn, page_size):
+    cursor, pages = None, []
+    while True:
+        sql, params = page_query("daily_log", ["id"], ("log_date", "id"), [], [], cursor, page_size=page_size)
+        df = pd.read_sql_query(sql, conn, params=params)
+        pages.append(df["id"].head(page_size).tolist())
+        if len(df) <= page_size:
+            return pages
+        cursor = row_cursor(df.head(page_size), 2)
+
+
+def test_pages_do_not_repeat_when_dates_tie():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE daily_log (id INTEGER PRIMARY KEY, log_date TEXT)")
+    conn.executemany("INSERT INTO daily_log (log_date) VALUES (?)", [("2025-01-01",)] * 25)
+
+    pages = _pages(conn, 10)
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert pages[1] != pages[0]
+    assert sorted(sum(pages, []), reverse=True) == list(range(25, 0, -1))
+
+
+def test_row_cursor_returns_python_scalars():
+    df = pd.DataFrame({"_key0": ["2025-01-01"], "_key1": [7]})
+    cursor = row_cursor(df, 2)
+    assert cursor == ("2025-01-01", 7)
+    assert type(cursor[1]) is int
+
+
+def test_prefix_condition_matches_wildcards_literally():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE sales (customer_name TEXT)")
+    conn.executemany("INSERT INTO sales VALUES (?)", [("50% Traders",), ("500 Bricks",), ("a_b",), ("axb",)])
+
+    def names(text):
+        condition, params = prefix_condition("customer_name", text)
+        return sorted(row[0] for row in conn.execute(f"SELECT customer_name FROM sales WHERE {condition}", params))
+
+    assert names("50%") == ["50% Traders"]
+    assert names("a_") == ["a_b"]
@@ -0,0 +1,122 @@
+"""Shared Streamlit UI helpers.
+
+``paginated_table`` pages through history with keyset pagination: each page
+is ``WHERE (order keys) < (last row's keys) ORDER BY keys DESC LIMIT n`` on an
+indexed date/id pair, so the cost of a page does not depend on how deep it is
+or how much history exists. Filters are pushed into the same SQL.
+"""
+from datetime import timedelta
+
+import streamlit as st
+
+from cache import read_sql
+
+PAGE_SIZE = 50
+
+
+# ------------------------ FILTERS ------------------------
+# Each filter widget returns a list of (sql condition, params) pairs.
+
+def date_range_filter(key, column, label="Date Range"):
+    selected = st.date_input(label, value=(), key=f"{key}_dates")
+    if not isinstance(selected, (tuple, list)) or len(selected) != 2:
+        return []
+    start, end = selected
+    # Half-open range so it works for both DATE and 'YYYY-MM-DD HH:MM:SS' columns
+    return [(f"{column} >= ? AND {column} < ?", (str(start), str(end + timedelta(days=1))))]
+
+
+def choice_filter(key, column, label, options):
+    choice = st.selectbox(label, ["All", *options], key=f"{key}_{column}")
+    if choice == "All":
+        return []
+    return [(f"{column} = ?", (choice,))]
+
+
+def prefix_condition(column, text):
+    """``(sql condition, params)`` matching ``column`` values that start with ``text``.
+
+    LIKE wildcards in ``text`` are escaped, so they match literally.
+    """
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{column} LIKE ? ESCAPE '\\'", (escaped + "%",)
+
+
+def prefix_filter(key, column, label):
+    text = st.text_input(label, key=f"{key}_{column}").strip()
+    if not text:
+        return []
+    return [prefix_condition(column, text)]
+
+
+# ------------------------ PAGINATION ------------------------
+def page_query(source, columns, order_by, conditions, params, cursor=None, page_size=PAGE_SIZE):
+    """SQL and params for the page after ``cursor`` (the previous page's last keys), one row extra.
+
+    The order keys come first in the select list as ``_key0``, ``_key1``, ...
+    """
+    conditions, params = list(conditions), list(params)
+    if cursor is not None:
+        conditions.append(f"({', '.join(order_by)}) < ({', '.join('?' for _ in order_by)})")
+        params.extend(cursor)
+
+    key_columns = [f"{col} AS _key{i}" for i, col in enumerate(order_by)]
+    sql = f"SELECT {', '.join(key_columns + list(columns))} FROM {source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(f"({cond})" for cond in conditions)
+    sql += f" ORDER BY {', '.join(f'{col} DESC' for col in order_by)} LIMIT {page_size + 1}"
+    return sql, params
+
+
+def row_cursor(df, key_count):
+    """The keys of the last row of ``df`` as plain Python values.
+
+    pandas hands back numpy scalars, and sqlite3 binds a ``numpy.int64`` as a
+    BLOB, which compares greater than every integer: the row-value ``<`` would
+    then match the whole boundary date again and "Next" would repeat the page.
+    """
+    values = df.iloc[-1][[f"_key{i}" for i in range(key_count)]]
+    return tuple(v.item() if hasattr(v, "item") else v for v in values)
+
+
+def paginate(key, source, columns, order_by, tables, filters=(), page_size=PAGE_SIZE):
+    """Render Prev/Next controls and return the current page as a DataFrame.
+
+    ``source`` is the FROM clause, ``columns`` the select list and ``order_by``
+    the indexed key columns, newest first (e.g. ``("log_date", "id")``).
+    """
+    conditions = [cond for cond, _ in filters]
+    params = [p for _, values in filters for p in values]
+
+    # Start over from the newest page whenever the filters change
+    signature = (tuple(conditions), tuple(params))
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+
+    sql, params = page_query(source, columns, order_by, conditions, params, cursors[-1], page_size)
+    df = read_sql(sql, tables, params)
+    has_next = len(df) > page_size
+    df = df.head(page_size)
+    key_names = [f"_key{i}" for i in range(len(order_by))]
+    next_cursor = row_cursor(df, len(order_by)) if has_next else None
+
+    def go_next():
+        cursors.append(next_cursor)
+
+    def go_prev():
+        cursors.pop()
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    col1.button("◀ Prev", key=f"{key}_prev", on_click=go_prev, disabled=len(cursors) == 1)
+    col2.button("Next ▶", key=f"{key}_next", on_click=go_next, disabled=not has_next)
+    col3.caption(f"Page {len(cursors)} · {len(df)} row(s)")
+
+    return df.drop(columns=key_names)
+
+
+def paginated_table(key, source, columns, order_by, tables, filters=(), page_size=PAGE_SIZE):
+    df = paginate(key, source, columns, order_by, tables, filters, page_size)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    return df
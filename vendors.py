@@ -0,0 +1,46 @@
+"""Vendor ledger: procurement, payments and balance per vendor.
+
+The list view needs one row per vendor, which ``VENDOR_LEDGER_QUERY`` builds
+in a single pass over ``materials`` and ``material_payments`` (both indexed
+by vendor). Item and payment rows are only read for the vendor being viewed.
+Amounts come back in paise.
+"""
+
+VENDOR_LEDGER_QUERY = """
+    SELECT v.id, v.name,
+           m.procured,
+           IFNULL(p.paid, 0) AS paid,
+           m.procured - IFNULL(p.paid, 0) AS balance,
+           MAX(m.last_date, IFNULL(p.last_date, '')) AS last_activity
+    FROM vendors v
+    JOIN (
+        SELECT vendor_id, SUM(total_price) AS procured, MAX(date) AS last_date
+        FROM materials
+        GROUP BY vendor_id
+    ) m ON m.vendor_id = v.id
+    LEFT JOIN (
+        SELECT vendor_id, SUM(amount) AS paid, MAX(date) AS last_date
+        FROM material_payments
+        GROUP BY vendor_id
+    ) p ON p.vendor_id = v.id
+    ORDER BY v.name
+"""
+VENDOR_LEDGER_TABLES = ("vendors", "materials", "material_payments")
+
+VENDOR_ITEMS_QUERY = """
+    SELECT date, material_type, quantity, unit, price_per_unit, total_price
+    FROM materials
+    WHERE vendor_id = ?
+    ORDER BY date DESC
+"""
+
+VENDOR_PAYMENTS_QUERY = """
+    SELECT date, amount
+    FROM material_payments
+    WHERE vendor_id = ?
+    ORDER BY date DESC
+"""
+
+
+def get_vendor_ledger(conn):
+    return conn.execute(VENDOR_LEDGER_QUERY).fetchall()
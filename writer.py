@@ -0,0 +1,156 @@
+"""Single-writer queue for every save in the app.
+
+Script threads never write to SQLite themselves. They submit a command, a
+function called as ``command(cursor, *args)``, and get a ``Future`` back. One
+writer thread owns the only write connection. It drains whatever commands
+are waiting and runs them all in one ``BEGIN IMMEDIATE`` transaction, so a
+burst of saves from several sessions costs one commit and never contends
+for the database lock inside this process.
+
+Each command runs under its own savepoint: a command that raises is rolled
+back on its own and its future gets the exception, while the rest of the
+batch still commits. Caches for the command's ``tables`` are invalidated
+once the batch has committed, before its future resolves.
+
+A failure outside any command never leaves a caller waiting: the batch's
+futures get the exception and the thread keeps serving. If the writer
+cannot start at all, ``submit`` raises. ``write`` withdraws a command that
+is still queued after ``WRITE_TIMEOUT`` seconds and raises ``NotSaved``, so
+nothing can commit behind the user's back and a retry cannot save twice.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as WaitTimeout
+
+import streamlit as st
+
+from cache import invalidate
+from db import DB_PATH, get_pool, open_conn
+
+MAX_BATCH = 64  # commands per group commit
+WRITE_TIMEOUT = 30  # seconds a save waits for its commit
+
+
+class NotSaved(RuntimeError):
+    """A write that was withdrawn before it ran; nothing of it was saved."""
+
+
+class WriteQueue:
+    """A writer thread that group-commits queued commands."""
+
+    def __init__(self, path, max_batch=MAX_BATCH):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._error = None  # set if the writer thread could not start
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, command, *args, tables=()):
+        """Queue ``command(cursor, *args)``; the future resolves to its return value after commit."""
+        if self._error is not None:
+            raise RuntimeError("The database writer is not running") from self._error
+        future = Future()
+        self._queue.put((command, args, tuple(tables), future))
+        return future
+
+    def close(self):
+        """Finish the queued commands, then stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            conn = open_conn(self.path)
+        except Exception as exc:
+            self._error = exc
+            self._fail_queued(exc)
+            return
+        conn.isolation_level = None  # transactions are managed explicitly below
+        cursor = conn.cursor()
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            # A future cancelled while queued is dropped without running its command
+            commands = [cmd for cmd in batch if cmd is not None and cmd[3].set_running_or_notify_cancel()]
+            if commands:
+                try:
+                    self._commit(cursor, commands)
+                except Exception as exc:
+                    for *_, future in commands:
+                        if not future.done():
+                            future.set_exception(exc)
+            if stop:
+                conn.close()
+                return
+
+    def _fail_queued(self, exc):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[3].set_running_or_notify_cancel():
+                item[3].set_exception(exc)
+
+    def _commit(self, cursor, commands):
+        outcomes = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for command, args, tables, future in commands:
+                cursor.execute("SAVEPOINT command")
+                try:
+                    outcomes.append((future, tables, command(cursor, *args), None))
+                except Exception as exc:
+                    cursor.execute("ROLLBACK TO command")
+                    outcomes.append((future, (), None, exc))
+                cursor.execute("RELEASE command")
+            cursor.execute("COMMIT")
+        except Exception as exc:
+            # The batch could not be committed (e.g. another process held the lock)
+            if cursor.connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            for *_, future in commands:
+                future.set_exception(exc)
+            return
+
+        invalidate(*{table for _, tables, _, _ in outcomes for table in tables})
+        for future, _, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+@st.cache_resource
+def get_writer():
+    get_pool()  # the pool migrates the schema before anything is written
+    return WriteQueue(DB_PATH)
+
+
+def write(command, *args, tables=()):
+    """Run ``command(cursor, *args)`` on the writer thread and wait for its commit.
+
+    Raises ``NotSaved`` if the command is still queued after ``WRITE_TIMEOUT``
+    seconds. A command the writer has already started is waited for, since
+    it may yet commit.
+    """
+    future = get_writer().submit(command, *args, tables=tables)
+    try:
+        return future.result(timeout=WRITE_TIMEOUT)
+    except WaitTimeout:
+        if future.cancel():
+            raise NotSaved(
+                f"Not saved: the database was busy for {WRITE_TIMEOUT} seconds. Nothing was written, please try again."
+            ) from None
+    return future.result()